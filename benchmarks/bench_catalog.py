@@ -0,0 +1,83 @@
+# Benchmark recipe lookups on a large generated catalog: exact and
+# multi-word dish matching, ingredient search and prefix autocomplete.
+#
+#   python benchmarks/bench_catalog.py [--recipes 100000]
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import RecipeCatalog
+
+ADJECTIVES = "spicy creamy smoky crispy roasted grilled baked garlic lemon honey sweet sour tangy herbed fried braised stuffed glazed pickled steamed " \
+             "chili ginger sesame peppery buttery cheesy zesty rustic classic quick slow summer winter autumn spring golden green red white black".split()
+MAINS = "chicken beef pork lamb tofu salmon tuna shrimp mushroom potato tomato spinach lentil chickpea bean rice noodle quinoa egg cheese " \
+        "pumpkin carrot onion pepper corn zucchini eggplant cabbage kale broccoli cauliflower apple banana berry cherry chocolate peach pear " \
+        "coconut almond walnut peanut duck turkey cod crab squid oat barley".split()
+DISHES = "soup stew salad pasta pizza curry pie cake tart bread sandwich wrap taco burrito risotto casserole skillet bowl stirfry kebab " \
+         "burger omelette pancake waffle muffin cookie pudding smoothie sauce dip roll dumpling bake gratin frittata quiche chowder chili " \
+         "hash salsa slaw skewer toast crumble parfait porridge noodles".split()
+STYLES = ["", " for two", " deluxe"]
+
+
+def write_catalog(path, count, seed=11):
+    rng = random.Random(seed)
+    names = list(itertools.islice(itertools.product(STYLES, ADJECTIVES, MAINS, DISHES), count))
+    with open(path, "w", encoding="utf-8") as f:
+        for style, adjective, main, dish in names:
+            ingredients = [main, rng.choice(MAINS), "salt", "olive oil", rng.choice(ADJECTIVES)]
+            f.write(json.dumps({"name": f"{adjective} {main} {dish}{style}", "ingredients": ingredients,
+                                "steps": [f"Prepare the {main}.", f"Cook it {adjective} style.", f"Serve as a {dish}."],
+                                "youtube_urls": []}) + "\n")
+    return [f"{adjective} {main} {dish}{style}" for style, adjective, main, dish in names]
+
+
+def timed(label, fn, inputs):
+    start = time.perf_counter()
+    for value in inputs:
+        fn(value)
+    elapsed = (time.perf_counter() - start) / len(inputs)
+    print(f"{label:>32}: {elapsed * 1e6:8.2f} us")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=100000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        names = write_catalog(path, args.recipes)
+        start = time.perf_counter()
+        catalog = RecipeCatalog.load(path)
+        print(f"loaded {len(catalog)} recipes in {time.perf_counter() - start:.2f}s")
+    finally:
+        os.remove(path)
+
+    rng = random.Random(1)
+    sample = rng.sample(names, 2000)
+    worst = max(
+        timed("exact name", catalog.match, sample),
+        timed("partial name (2 words)", catalog.match, [" ".join(name.split()[1:]) for name in sample]),
+        timed("single word", catalog.match, [name.split()[-1] for name in sample]),
+        timed("words in other order + noise", catalog.match, [f"{name.split()[2]} with {name.split()[0]} now" for name in sample]),
+        timed("formatted response (cached)", lambda name: catalog.response(catalog.match(name)), sample),
+        timed("ingredient search", catalog.with_ingredient, [name.split()[1] for name in sample]),
+        timed("autocomplete (3 letters)", catalog.complete, [name[:3] for name in sample]),
+        timed("autocomplete (2 words)", catalog.complete, [name[:len(name.split()[0]) + 3] for name in sample]),
+    )
+    print(f"slowest mean lookup {worst * 1e3:.3f} ms ({'sub-millisecond' if worst < 1e-3 else 'OVER 1 ms'})")
+    if worst >= 1e-3:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
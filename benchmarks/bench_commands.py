@@ -0,0 +1,233 @@
+# Regression benchmark for the command engine. Replays the labelled corpus
+# (benchmarks/corpus.py) through get_assistant_response in one thread and
+# in many threads sharing a home, and reports throughput plus latency
+# percentiles and allocations per case. With --save the run becomes the
+# baseline; otherwise it is compared with the saved baseline and the script
+# exits 1 on a statistically significant slowdown or allocation growth.
+# Baselines are only comparable on the machine that recorded them.
+#
+#   python benchmarks/bench_commands.py [--save] [--threads 8] [--corpus corpus.jsonl]
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus as corpora
+from commands import get_assistant_response
+from devices import DeviceRegistry
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".baselines", "commands.json")
+KEPT_SAMPLES = 400
+ALLOC_SAMPLES = 100
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+# Per-case latencies in ns from one pass over the corpus
+def replay(corpus, registry, latencies):
+    clock = time.perf_counter_ns
+    for case, text in corpus:
+        start = clock()
+        get_assistant_response(text, registry)
+        latencies.setdefault(case, []).append(clock() - start)
+
+
+# Each utterance's best time over the rounds: scheduler and cache noise only
+# ever adds time, so the minimum is the most repeatable figure
+def single_thread(corpus, rounds):
+    registry = DeviceRegistry.with_defaults()
+    replay(corpus, registry, {})
+    clock = time.perf_counter_ns
+    best = [math.inf] * len(corpus)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i, (case, text) in enumerate(corpus):
+            began = clock()
+            get_assistant_response(text, registry)
+            best[i] = min(best[i], clock() - began)
+    rate = rounds * len(corpus) / (time.perf_counter() - start)
+    latencies = {}
+    for (case, _), value in zip(corpus, best):
+        latencies.setdefault(case, []).append(value)
+    return latencies, rate
+
+
+def many_threads(corpus, threads, rounds):
+    registry = DeviceRegistry.with_defaults()
+    results = [{} for _ in range(threads)]
+    shuffled = []
+    for i in range(threads):
+        order = list(corpus)
+        random.Random(i).shuffle(order)
+        shuffled.append(order)
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(i):
+        barrier.wait()
+        for _ in range(rounds):
+            replay(shuffled[i], registry, results[i])
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = {}
+    for result in results:
+        for case, values in result.items():
+            latencies.setdefault(case, []).extend(values)
+    return latencies, threads * rounds * len(corpus) / elapsed
+
+
+# Mean peak bytes allocated while handling one utterance, per case
+def allocations(corpus):
+    registry = DeviceRegistry.with_defaults()
+    replay(corpus, registry, {})
+    seen = {}
+    tracemalloc.start()
+    try:
+        for case, text in corpus:
+            if len(seen.setdefault(case, [])) >= ALLOC_SAMPLES:
+                continue
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            get_assistant_response(text, registry)
+            seen[case].append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return {case: sum(values) / len(values) for case, values in seen.items()}
+
+
+# One-sided Mann-Whitney U test (normal approximation): probability of a
+# shift at least this large towards slower current samples by chance
+def slower_p_value(baseline, current):
+    n1, n2 = len(current), len(baseline)
+    ranked = sorted([(value, 0) for value in current] + [(value, 1) for value in baseline])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0) - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def summarize(latencies, allocated):
+    cases = {}
+    for case, values in sorted(latencies.items()):
+        values = sorted(values)
+        kept = random.Random(0).sample(values, min(KEPT_SAMPLES, len(values)))
+        cases[case] = {
+            "count": len(values),
+            "mean_us": sum(values) / len(values) / 1e3,
+            "p50_us": percentile(values, 0.5) / 1e3,
+            "p90_us": percentile(values, 0.9) / 1e3,
+            "p99_us": percentile(values, 0.99) / 1e3,
+            "alloc_bytes": allocated.get(case, 0.0),
+            "samples_ns": kept,
+        }
+    return cases
+
+
+def compare(baseline, current, alpha, tolerance):
+    problems = []
+    cases = [case for case in current if case in baseline]
+    for case in cases:
+        old, new = baseline[case], current[case]
+        ratio = new["p50_us"] / old["p50_us"] if old["p50_us"] else 1.0
+        p = slower_p_value(old["samples_ns"], new["samples_ns"])
+        if ratio > 1 + tolerance and p < alpha / len(cases):
+            problems.append(f"{case}: p50 {old['p50_us']:.1f} -> {new['p50_us']:.1f} us (x{ratio:.2f}, p={p:.1e})")
+        if new["alloc_bytes"] > old["alloc_bytes"] * (1 + tolerance) + 512:
+            problems.append(f"{case}: allocations {old['alloc_bytes']:.0f} -> {new['alloc_bytes']:.0f} bytes")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="replay this corpus file instead of generating one")
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="record this run as the baseline")
+    parser.add_argument("--alpha", type=float, default=0.01, help="significance level, split across cases")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="slowdown ignored however significant")
+    args = parser.parse_args()
+
+    corpus = corpora.load(args.corpus) if args.corpus else corpora.generate(args.size, args.seed)
+    missing = corpora.missing_intents()
+    if missing:
+        print(f"corpus does not cover: {', '.join(missing)}")
+
+    single, single_rate = single_thread(corpus, args.rounds)
+    threaded, threaded_rate = many_threads(corpus, args.threads, max(1, args.rounds // 2))
+    allocated = allocations(corpus)
+    cases = summarize(single, allocated)
+    threaded_cases = summarize(threaded, {})
+
+    print(f"{len(corpus)} utterances, {len(cases)} cases")
+    print(f"single thread: {single_rate:9.0f} commands/s")
+    print(f"{args.threads:>2} threads:    {threaded_rate:9.0f} commands/s  "
+          f"p99 {percentile(sorted(v for values in threaded.values() for v in values), 0.99) / 1e3:.1f} us")
+    print(f"{'case':>32} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'p99 mt':>8} {'alloc B':>8}")
+    for case, stats in cases.items():
+        print(f"{case:>32} {stats['mean_us']:8.1f} {stats['p50_us']:8.1f} {stats['p90_us']:8.1f} {stats['p99_us']:8.1f} "
+              f"{threaded_cases[case]['p99_us']:8.1f} {stats['alloc_bytes']:8.0f}")
+
+    run = {
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "corpus": args.corpus or f"generated size={args.size} seed={args.seed}",
+        "single_rate": single_rate,
+        "threaded_rate": threaded_rate,
+        "threads": args.threads,
+        "cases": cases,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(run, f)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("no baseline yet; run with --save to record one")
+        return
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"baseline: {baseline['single_rate']:.0f} commands/s single, {baseline['threaded_rate']:.0f} threaded")
+    problems = compare(baseline["cases"], cases, args.alpha, args.tolerance)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        sys.exit(1)
+    print("no significant regressions")
+
+
+if __name__ == "__main__":
+    main()
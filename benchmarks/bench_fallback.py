@@ -0,0 +1,85 @@
+# Benchmark the fuzzy fallback classifier: build time, single-utterance and
+# batched scoring latency, and the cost it adds to an unrecognized command.
+#
+#   python benchmarks/bench_fallback.py [--batch 256]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import handle_command
+from devices import DeviceRegistry
+from fallback import IntentClassifier
+
+# Near misses and the intent each must be guessed as
+EXPECTED = {
+    "switch on the light": "device_toggle", "turn the tv off": "device_toggle", "pls lock door": "door_lock",
+    "lights on in kitchen": "device_toggle", "open garage": "open_close_device", "swich on the lite": "device_toggle",
+    "night mode please": "night_mode", "is the fan": "status_check", "preheat oven to 200": "set_oven",
+    "play some rock": "play_music", "turn the lights off in the bedroom": "device_toggle",
+    "how do i make chocolate cake": "cook_dish", "turn everything off": "all_devices_off",
+    "can you turn on all lights": "all_lights_on", "is the door open": "status_check",
+}
+NEAR_MISSES = list(EXPECTED)
+NOISE = ["tell me a joke", "asdf qwer", "what is the weather", "where is my phone", "order a pizza", "is it raining"]
+# Must never be acted on: negated commands, and weak guesses at the lock or garage
+NEGATED = [
+    "dont unlock the door", "do not turn on the oven", "never open the garage", "don't open the garage door",
+    "please dont lock door", "no lights on", "do not start the vacuum", "never turn off the security camera",
+]
+# Must never be acted on either: the opposite of the closest phrase, and
+# commands that only a status check resembles
+CONTRADICTED = [
+    "turn off all lights", "switch off all the lights", "all lights off", "turn all the lights off",
+    "turn on all devices", "turn everything on", "switch on everything",
+    "open the door", "close the door", "turn off the door",
+]
+
+
+def timed(label, fn, inputs, per=1):
+    start = time.perf_counter()
+    for value in inputs:
+        fn(value)
+    elapsed = (time.perf_counter() - start) / (len(inputs) * per)
+    print(f"{label:>32}: {elapsed * 1e6:8.2f} us")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=256)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = IntentClassifier()
+    print(f"built {len(classifier.labels)} phrases x {len(classifier.vocabulary)} n-grams "
+          f"in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    rng = random.Random(3)
+    sample = [rng.choice(NEAR_MISSES + NOISE) for _ in range(2000)]
+    batches = [sample[i:i + args.batch] for i in range(0, len(sample), args.batch)]
+    registry = DeviceRegistry.with_defaults()
+    timed("classify (near miss)", classifier.classify, [u for u in sample if u in NEAR_MISSES])
+    timed("classify (no match)", classifier.classify, [u for u in sample if u in NOISE])
+    timed(f"classify_many (batch {args.batch})", classifier.classify_many, batches, len(sample) / len(batches))
+    timed("handle_command via fallback", lambda u: handle_command(u, registry), sample)
+
+    guessed = {u: getattr(classifier.classify(u), "action", None) for u in NEAR_MISSES}
+    wrong = sorted(u for u, action in guessed.items() if action != EXPECTED[u])
+    rejected = sum(classifier.classify(u) is None for u in NOISE)
+    acted = sorted(u for u in NEGATED + CONTRADICTED if classifier.classify(u) is not None)
+    print(f"near misses recognized {len(NEAR_MISSES) - len(wrong)}/{len(NEAR_MISSES)}, "
+          f"noise rejected {rejected}/{len(NOISE)}, "
+          f"negated or contradicted commands rejected {len(NEGATED) + len(CONTRADICTED) - len(acted)}"
+          f"/{len(NEGATED) + len(CONTRADICTED)}")
+    if acted:
+        sys.exit(f"acted on negated or contradicted commands: {acted}")
+    if wrong:
+        sys.exit(f"wrong intent for: {[(u, guessed[u], EXPECTED[u]) for u in wrong]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# Benchmark chat history rendering: the per-rerun cost of drawing the
+# visible window should stay flat however long the conversation gets.
+#
+#   python benchmarks/bench_history.py
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import PAGE_SIZE, MessageStore
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    for turns in (10, 1000, 100000):
+        store = MessageStore(spill_path=os.path.join(directory, f"chat-{turns}.jsonl"))
+        for i in range(turns):
+            store.append("user", f"turn on the light in the room{i}")
+            store.append("assistant", f"The light in the room{i} has been turned on.")
+        for visible in (PAGE_SIZE, 10 * PAGE_SIZE, 50 * PAGE_SIZE):
+            repeat = 200
+            start = time.perf_counter()
+            for _ in range(repeat):
+                store.render(visible)
+            elapsed = (time.perf_counter() - start) / repeat
+            print(f"{len(store):>7} messages, {visible:>4} visible: {elapsed * 1e6:9.1f} us per rerun")
+        store.clear()
+    os.rmdir(directory)
+
+
+if __name__ == "__main__":
+    main()
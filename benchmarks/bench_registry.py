@@ -0,0 +1,73 @@
+# Benchmark the device registry at scale: lookups, command handling,
+# "turn off all devices", scene activation and status reports in homes
+# with tens of thousands of devices.
+#
+#   python benchmarks/bench_registry.py [--devices 50000] [--rooms 500]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import handle_command
+from devices import DEVICE_TYPES, DeviceRegistry
+
+
+def populate(devices, rooms, seed=3):
+    rng = random.Random(seed)
+    registry = DeviceRegistry.with_defaults()
+    types = list(DEVICE_TYPES)
+    for i in range(devices):
+        registry.add(rng.choice(types), f"room{rng.randrange(rooms)}")
+    for device in registry.active():
+        registry.update(device, state="off")
+    return registry
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:>40}: {elapsed * 1e6:10.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=50000)
+    parser.add_argument("--rooms", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = populate(args.devices, args.rooms)
+    print(f"{len(registry)} devices in {args.rooms} rooms, populated in {time.perf_counter() - start:.2f}s")
+
+    timed("find(type, room)", lambda: registry.find("light", "room7"), 10000)
+    timed("turn on the light in the room7", lambda: handle_command("turn on the light in the room7", registry), 2000)
+    timed("is the light in the room7 on", lambda: handle_command("is the light in the room7 on", registry), 2000)
+
+    def few_on_then_off():
+        for room in ("room1", "room2", "room3"):
+            handle_command(f"turn on the fan in the {room}", registry)
+        handle_command("can you turn off all devices", registry)
+    timed("3 devices on + turn off all devices", few_on_then_off, 200)
+    timed("night mode (first, every light changes)", lambda: handle_command("can you set the home to night mode", registry), 1)
+    timed("night mode again (nothing to change)", lambda: handle_command("can you set the home to night mode", registry), 200)
+
+    def one_on_then_night():
+        handle_command("turn on the light in the room5", registry)
+        handle_command("can you set the home to night mode", registry)
+    timed("1 light on + night mode", one_on_then_night, 200)
+    timed("status of my home (first, full render)", lambda: handle_command("what is the status of my home", registry), 1)
+
+    def change_then_status():
+        handle_command("turn on the tv in the room9", registry)
+        handle_command("what is the status of my home", registry)
+    timed("1 change + status of my home", change_then_status, 200)
+    timed("1 change + check if the house is secure", lambda: (handle_command("lock the door in the room4", registry), handle_command("can you check if the house is secure", registry)), 200)
+
+
+if __name__ == "__main__":
+    main()
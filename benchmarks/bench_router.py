@@ -0,0 +1,127 @@
+# Microbenchmark: per-utterance routing latency of the precompiled
+# IntentRouter against the old per-call pattern list + re.match loop.
+# Before timing, the labelled corpus (every pattern, room suffixes and
+# out-of-range values) is replayed through both, and any difference in
+# the replies fails the run.
+#
+#   python benchmarks/bench_router.py [--extra 300] [--rounds 2000] [--check 5000]
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus as corpora
+from commands import INVALID_COMMAND, IntentRouter, handlers, patterns, router
+from devices import DEVICE_TYPES, DeviceRegistry
+
+UTTERANCES = [
+    "hello",
+    "turn on the light in the kitchen",
+    "set the temperature to 24 degrees",
+    "turn off the porch light",
+    "unlock the door",
+    "open the blinds in the bedroom",
+    "play jazz on the speaker",
+    "set the oven to 180",
+    "start the vacuum in the hall",
+    "set the humidifier to 45 percent",
+    "make coffee",
+    "is the tv in the bedroom on",
+    "what is the oven temperature",
+    "cook pasta",
+    "what is the status of my home",
+    "can you check if the house is secure",
+    "what can you do",
+    "please dim the lights",
+]
+
+
+# Old behaviour: rebuild the table (including the f-string) on every call
+# and try each pattern in turn until one matches.
+def legacy_route(text, table):
+    rebuilt = [
+        (pattern, action, f"I can control {len(DEVICE_TYPES)} devices." if action == "device_count" else response)
+        for pattern, action, response in table
+    ]
+    for pattern, action, response in rebuilt:
+        match = re.match(pattern, text)
+        if match:
+            return action, match.groups()
+    return None
+
+
+def router_route(text, router):
+    for action, response, groups in router.matches(text):
+        return action, groups
+    return None
+
+
+# Replies through the old loop and through the router, each on its own
+# home; both fall through to the next matching pattern when a handler
+# declines, and neither uses the fuzzy fallback
+def legacy_reply(text, registry):
+    for pattern, action, response in patterns:
+        match = re.match(pattern, text)
+        if match:
+            reply = handlers[action](registry, match.groups(), response)
+            if reply is not None:
+                return reply
+    return INVALID_COMMAND
+
+
+def router_reply(text, registry):
+    for action, response, groups in router.matches(text):
+        reply = handlers[action](registry, groups, response)
+        if reply is not None:
+            return reply
+    return INVALID_COMMAND
+
+
+def check_replies(size):
+    missing = corpora.missing_intents()
+    if missing:
+        sys.exit(f"corpus does not cover: {', '.join(missing)}")
+    legacy_home, router_home = DeviceRegistry.with_defaults(), DeviceRegistry.with_defaults()
+    for case, text in corpora.generate(size):
+        old, new = legacy_reply(text, legacy_home), router_reply(text, router_home)
+        if old != new:
+            sys.exit(f"reply mismatch ({case}) for {text!r}: {old!r} != {new!r}")
+    print(f"{size} utterances: replies identical to the old loop")
+
+
+def synthetic_routes(count):
+    return [(rf"intent{i} (\w+)(?: in the (\w+))?", f"intent{i}", None) for i in range(count)]
+
+
+def measure(fn, arg, utterances, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in utterances:
+            fn(text, arg)
+    return (time.perf_counter() - start) / (rounds * len(utterances))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Intent routing latency: IntentRouter vs. the old pattern loop")
+    parser.add_argument("--extra", type=int, default=300, help="synthetic intents appended for the scaling run")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--check", type=int, default=5000, help="corpus utterances replayed to compare replies")
+    args = parser.parse_args()
+
+    check_replies(args.check)
+    for label, table in (("32 intents", patterns), (f"{len(patterns) + args.extra} intents", patterns + synthetic_routes(args.extra))):
+        router = IntentRouter(table)
+        utterances = UTTERANCES + [f"intent{args.extra - 1} x"] if args.extra and len(table) > len(patterns) else UTTERANCES
+        for text in utterances:
+            if legacy_route(text, table) != router_route(text, router):
+                sys.exit(f"routing mismatch for {text!r}")
+        legacy = measure(legacy_route, table, utterances, args.rounds)
+        compiled = measure(router_route, router, utterances, args.rounds)
+        print(f"{label:>12}: legacy {legacy * 1e6:8.2f} us/utterance  router {compiled * 1e6:8.2f} us/utterance  ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Load-test the headless command server: requests/sec and p50/p99 latency
+# at rising concurrency, each connection pipelining several requests and
+# driving its own home. Starts server.py in a subprocess unless --address
+# points at a running one.
+#
+#   python benchmarks/bench_server.py [--levels 1,8,64,256] [--pipeline 4] [--processes 2]
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = [
+    "turn on the light", "turn off the light", "turn on the tv in the kitchen", "set the temperature to 22",
+    "lock the door", "unlock the door", "is the fan on", "what is the temperature", "play jazz on the speaker",
+    "what is the status of my home", "can you check if the house is secure", "how many devices can you control",
+    "make pasta", "can you set the home to night mode", "switch on the light",
+]
+
+
+def _request(home, text):
+    body = json.dumps({"home": home, "text": text}).encode("utf-8")
+    return b"POST /command HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    status = int(head.split(b" ", 2)[1])
+    await reader.readexactly(length)
+    return status
+
+
+# One keep-alive connection with up to `pipeline` requests in flight
+async def _client(host, port, home, pipeline, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    sent = []
+    try:
+        while True:
+            while len(sent) < pipeline and time.perf_counter() < deadline:
+                writer.write(_request(home, rng.choice(COMMANDS)))
+                sent.append(time.perf_counter())
+            if not sent:
+                break
+            await writer.drain()
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - sent.pop(0))
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def _clients(host, port, first, count, pipeline, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        _client(host, port, f"home-{i}", pipeline, deadline, latencies, errors, i) for i in range(first, first + count)
+    ))
+    return latencies, len(errors)
+
+
+def _run_clients(args):
+    return asyncio.run(_clients(*args))
+
+
+# Spread `concurrency` connections over client processes so the client
+# side is not the bottleneck
+def _level(host, port, concurrency, pipeline, seconds, processes):
+    processes = max(1, min(processes, concurrency))
+    shares = [(concurrency + i) // processes for i in range(processes)]
+    jobs = [(host, port, sum(shares[:i]), share, pipeline, seconds) for i, share in enumerate(shares)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_run_clients(jobs[0])]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_run_clients, jobs)
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{concurrency:>6} clients: {len(latencies) / elapsed:9.0f} req/s   p50 {p50 * 1e3:7.2f} ms   "
+          f"p99 {p99 * 1e3:7.2f} ms   errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--address", help="host:port of a running server (default: start one)")
+    parser.add_argument("--levels", default="1,8,64,256", help="comma-separated client counts")
+    parser.add_argument("--pipeline", type=int, default=4, help="requests in flight per connection")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each level")
+    parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="client processes")
+    args = parser.parse_args()
+
+    process = None
+    if args.address:
+        host, port = args.address.rsplit(":", 1)
+    else:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "server.py"), "--port", "0"],
+            stdout=subprocess.PIPE, text=True, cwd=ROOT,
+        )
+        host, port = process.stdout.readline().strip().rsplit("/", 1)[1].rsplit(":", 1)
+    try:
+        for concurrency in (int(level) for level in args.levels.split(",")):
+            _level(host, int(port), concurrency, args.pipeline, args.seconds, args.processes)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
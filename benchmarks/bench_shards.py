@@ -0,0 +1,102 @@
+# Sharded execution benchmark: thousands of homes send a mixed stream of
+# commands from the labelled corpus (benchmarks/corpus.py), first through
+# one in-process engine and then through ShardPool at rising worker counts.
+# Client threads each own a slice of the homes and send their commands in
+# batches. Reports commands/s and the speedup over one worker, checks that
+# every reply matches the in-process run (per-home order kept), and times
+# adding and removing a worker with all homes placed.
+#
+#   python benchmarks/bench_shards.py [--homes 5000] [--commands 100000] [--workers 1,2,4,8]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corpus as corpora
+from commands import get_assistant_result
+from server import Homes
+from shards import ShardPool
+
+
+# One command stream per client; a home only ever appears in one stream
+def streams(homes, size, clients, seed):
+    rng = random.Random(seed)
+    result = [[] for _ in range(clients)]
+    for _, text in corpora.generate(size, seed):
+        home = rng.randrange(homes)
+        result[home % clients].append((f"home-{home}", text))
+    return result
+
+
+def in_process(streams):
+    homes = Homes()
+    start = time.perf_counter()
+    replies = [[get_assistant_result(text, homes.get(home_id)).text for home_id, text in stream] for stream in streams]
+    return replies, sum(map(len, streams)) / (time.perf_counter() - start)
+
+
+# Make every worker build its fallback classifier before the clock starts
+def warm(pool):
+    i = 0
+    while min(pool.placement().values()) == 0:
+        pool.map([(f"warm-{i}", "swich on the lite")])
+        i += 1
+
+
+def sharded(pool, streams, batch):
+    replies = [None] * len(streams)
+
+    def client(i):
+        stream = streams[i]
+        replies[i] = [result.text for start in range(0, len(stream), batch) for result in pool.map(stream[start:start + batch])]
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(len(streams))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return replies, sum(map(len, streams)) / (time.perf_counter() - start)
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--homes", type=int, default=5000)
+    parser.add_argument("--commands", type=int, default=100000)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, cpus}) if n <= max(cpus, 2)))
+    parser.add_argument("--clients", type=int, default=8, help="client threads, each owning a slice of the homes")
+    parser.add_argument("--batch", type=int, default=500, help="commands per client batch")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    work = streams(args.homes, args.commands, args.clients, args.seed)
+    expected, rate = in_process(work)
+    print(f"{args.commands} commands over {args.homes} homes, {args.clients} clients, {cpus} CPUs")
+    print(f"   in-process: {rate:9.0f} commands/s")
+    single = None
+    for workers in (int(n) for n in args.workers.split(",")):
+        with ShardPool(workers) as pool:
+            warm(pool)
+            replies, rate = sharded(pool, work, args.batch)
+            single = single or rate
+            mismatches = sum(a != b for stream, want in zip(replies, expected) for a, b in zip(stream, want))
+            print(f"{workers:>3} workers: {rate:9.0f} commands/s  x{rate / single:4.2f}  mismatched replies {mismatches}")
+            if workers > 1:
+                placed = sum(pool.placement().values())
+                start = time.perf_counter()
+                pool.add_worker()
+                added, moved = time.perf_counter() - start, pool.moved
+                start = time.perf_counter()
+                pool.remove_worker()
+                removed = time.perf_counter() - start
+                print(f"{'':>13}add a worker: {moved} of {placed} homes moved in {added * 1e3:.0f} ms, "
+                      f"remove it: {pool.moved - moved} moved in {removed * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
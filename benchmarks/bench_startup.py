@@ -0,0 +1,84 @@
+# Cold-start benchmark. Each round runs in a fresh interpreter and reports
+# the import time of the engine and of everything app.py imports, the time
+# to the first reply, and the first near miss (which loads the NumPy
+# fallback). With streamlit installed it also runs app.py headless through
+# streamlit.testing and reports the first run and the per-rerun overhead.
+#
+#   python benchmarks/bench_startup.py [--rounds 5] [--reruns 20]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON object of timings
+COLD = """
+import json, sys, time
+timings = {}
+start = time.perf_counter()
+import commands
+timings["import commands"] = time.perf_counter() - start
+start = time.perf_counter()
+import history, metrics, statelog, tts
+timings["import app modules"] = time.perf_counter() - start
+start = time.perf_counter()
+commands.get_assistant_response("turn on the light", commands.DeviceRegistry.with_defaults())
+timings["first reply"] = time.perf_counter() - start
+start = time.perf_counter()
+commands.get_assistant_response("swich on the lite", commands.DeviceRegistry.with_defaults())
+timings["first near miss"] = time.perf_counter() - start
+timings["speech stack loaded"] = float("speech_recognition" in sys.modules or "pyttsx3" in sys.modules)
+print(json.dumps(timings))
+"""
+
+RERUNS = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+reruns = int(sys.argv[1])
+timings = {}
+start = time.perf_counter()
+app = AppTest.from_file("app.py", default_timeout=60).run()
+timings["first run"] = time.perf_counter() - start
+start = time.perf_counter()
+for _ in range(reruns):
+    app.run()
+timings["rerun"] = (time.perf_counter() - start) / reruns
+print(json.dumps(timings))
+"""
+
+
+def _child(script, *args):
+    output = subprocess.run(
+        [sys.executable, "-c", script, *args], cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _report(runs):
+    for name in runs[0]:
+        values = sorted(run[name] for run in runs)
+        if name == "speech stack loaded":
+            print(f"{name:>22}: {'yes' if any(values) else 'no'}")
+        else:
+            print(f"{name:>22}: min {values[0] * 1e3:8.1f} ms   median {values[len(values) // 2] * 1e3:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--reruns", type=int, default=20, help="script reruns timed per app session")
+    args = parser.parse_args()
+
+    _report([_child(COLD) for _ in range(args.rounds)])
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except ImportError:
+        print("app reruns: skipped (streamlit is not installed)")
+        return
+    _report([_child(RERUNS, str(args.reruns)) for _ in range(args.rounds)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark the device state log: write throughput with group commit, and
+# restart time as the snapshot and the unsnapshotted log tail grow. A batch
+# is committed when the sync interval passes or batch_size records are
+# waiting, whichever comes first, so each throughput table varies one
+# trigger with the other switched off.
+#
+#   python benchmarks/bench_statelog.py [--writes 100000]
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devices import DEVICE_TYPES, DeviceRegistry
+from statelog import StateLog
+
+NEVER = float("inf")
+
+
+def seeded(devices, rooms=200, seed=5):
+    rng = random.Random(seed)
+    types = list(DEVICE_TYPES)
+
+    def seed_registry():
+        registry = DeviceRegistry.with_defaults()
+        for _ in range(devices):
+            registry.add(rng.choice(types), f"room{rng.randrange(rooms)}")
+        return registry
+    return seed_registry
+
+
+def toggle(registry, count, seed=9):
+    rng = random.Random(seed)
+    devices = registry.devices()
+    for i in range(count):
+        registry.update(rng.choice(devices), state="on" if i % 2 else "off")
+
+
+def write_throughput(writes, label, sync_interval=None, batch_size=NEVER):
+    directory = tempfile.mkdtemp()
+    try:
+        log = StateLog(directory, sync_interval=sync_interval, batch_size=batch_size, compact_bytes=NEVER)
+        registry = log.open(seeded(1000))
+        start = time.perf_counter()
+        toggle(registry, writes)
+        log.close()
+        elapsed = time.perf_counter() - start
+        stats = log.stats()
+        print(f"  {label:>24}: {writes / elapsed:10.0f} writes/s  ({stats['batches']} fsyncs)")
+    finally:
+        shutil.rmtree(directory)
+
+
+def restart_time(devices, tail):
+    directory = tempfile.mkdtemp()
+    try:
+        log = StateLog(directory, compact_bytes=NEVER)
+        registry = log.open(seeded(devices))
+        toggle(registry, tail)
+        log.close()
+        log = StateLog(directory, compact_bytes=NEVER)
+        start = time.perf_counter()
+        log.open()
+        elapsed = time.perf_counter() - start
+        log.close()
+        print(f"  {devices:>7} devices, {tail:>7} log records: restart {elapsed * 1000:8.1f}ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("write throughput by sync interval (no batch limit)")
+    for interval in (0.005, 0.05, 0.5):
+        write_throughput(args.writes, f"sync every {interval * 1000:g}ms", sync_interval=interval)
+    print("write throughput by batch size (no interval)")
+    for batch_size in (64, 512, 4096):
+        write_throughput(args.writes, f"sync every {batch_size} records", batch_size=batch_size)
+    print("restart time")
+    for devices in (1000, 10000, 50000):
+        for tail in (0, 10000, 100000):
+            restart_time(devices, tail)
+
+
+if __name__ == "__main__":
+    main()
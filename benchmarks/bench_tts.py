@@ -0,0 +1,178 @@
+# Benchmark and check the speech worker offline, with a fake engine that
+# "speaks" one word every --word-ms instead of producing audio (and a fake
+# player for the cached path). Reports how long say() takes to return and
+# how long a newer reply takes to cut off the one playing, and exits
+# non-zero if interrupted, dropped or spoken utterances are miscounted.
+#
+#   python benchmarks/bench_tts.py [--rounds 20] [--word-ms 5]
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts import SpeechWorker
+from tts_cache import SpeechCache
+
+COUNTERS = ("queued", "spoken", "interrupted", "dropped", "failed")
+
+
+# pyttsx3-like engine: runAndWait() fires "started-word" for every word and
+# stops early once stop() is called from inside the callback
+class FakeEngine:
+    def __init__(self, word_s):
+        self.word_s = word_s
+        self.words = []
+        self.stop_threads = set()
+        self._callback = None
+        self._queued = []
+        self._stopped = False
+
+    def setProperty(self, name, value):
+        pass
+
+    def getProperty(self, name):
+        return "fake"
+
+    def connect(self, topic, callback):
+        self._callback = callback
+
+    def say(self, text):
+        self._queued.append((text, None))
+
+    def save_to_file(self, text, path):
+        self._queued.append((text, path))
+
+    def stop(self):
+        self.stop_threads.add(threading.current_thread().name)
+        self._stopped = True
+
+    def runAndWait(self):
+        self._stopped = False
+        for text, path in self._queued:
+            words = text.split()
+            for i, word in enumerate(words):
+                self._callback(None, i, len(word))
+                if self._stopped:
+                    break
+                time.sleep(self.word_s)
+                self.words.append(word)
+            if path is not None:
+                with open(path, "wb") as f:
+                    f.write(text.encode("utf-8"))
+        self._queued = []
+
+
+# Plays a cached file by sleeping through it; stop() ends it early
+class FakePlayer:
+    def __init__(self, word_s):
+        self.word_s = word_s
+        self.played = []
+        self._stop = threading.Event()
+
+    def play(self, path, cancelled=None):
+        self._stop.clear()
+        if cancelled is not None and cancelled():
+            return
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        self.played.append(text)
+        self._stop.wait(self.word_s * len(text.split()))
+
+    def stop(self):
+        self._stop.set()
+
+
+def long_text(name, words=40):
+    return " ".join([name] * words)
+
+
+def counters(worker):
+    stats = worker.stats()
+    return {name: stats[name] for name in COUNTERS}
+
+
+# Each scenario returns (counters expected, counters seen, worker threads
+# that stopped the engine)
+def interrupt_playing(word_s, cache_dir=None):
+    engine = FakeEngine(word_s)
+    if cache_dir is None:
+        worker = SpeechWorker(engine_factory=lambda: engine).start()
+    else:
+        worker = SpeechWorker(engine_factory=lambda: engine, cache=SpeechCache(cache_dir), player=FakePlayer(word_s)).start()
+    worker.say(long_text("first"))
+    time.sleep(word_s * 5)
+    worker.say("second")
+    worker.wait_idle(10)
+    worker.close(10)
+    return dict(queued=2, spoken=1, interrupted=1, dropped=0, failed=0), counters(worker), engine.stop_threads
+
+
+def drop_queued(word_s):
+    engine = FakeEngine(word_s)
+    worker = SpeechWorker(engine_factory=lambda: engine).start()
+    worker.say(long_text("first"))
+    time.sleep(word_s * 5)
+    worker.say("second", interrupt=False)
+    worker.say("third", interrupt=False)
+    worker.say("fourth")
+    worker.interrupt()
+    worker.interrupt()
+    worker.wait_idle(10)
+    worker.close(10)
+    return dict(queued=4, spoken=0, interrupted=1, dropped=3, failed=0), counters(worker), engine.stop_threads
+
+
+def timings(word_s, rounds):
+    engine = FakeEngine(word_s)
+    worker = SpeechWorker(engine_factory=lambda: engine).start()
+    worker.wait_idle(10)
+    said = cut = 0.0
+    for i in range(rounds):
+        worker.say(long_text(f"long{i}"))
+        time.sleep(word_s * 3)
+        heard = len(engine.words)
+        start = time.perf_counter()
+        worker.say(f"short{i}")
+        said += time.perf_counter() - start
+        while not engine.words or engine.words[-1] != f"short{i}":
+            time.sleep(word_s / 10)
+        cut += time.perf_counter() - start
+        if heard + 3 < engine.words.index(f"short{i}", heard):
+            sys.exit(f"round {i}: cut-off utterance kept playing")
+    worker.close(10)
+    return said / rounds, cut / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--word-ms", type=float, default=5, help="time the fake engine takes per word")
+    args = parser.parse_args()
+    word_s = args.word_ms / 1e3
+
+    said, cut = timings(word_s, args.rounds)
+    print(f"{'say() returns in':>28}: {said * 1e6:8.1f} us")
+    print(f"{'newer reply heard after':>28}: {cut * 1e3:8.1f} ms  ({args.word_ms:g} ms per word)")
+
+    failures = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        scenarios = {
+            "interrupt while speaking": interrupt_playing(word_s),
+            "interrupt while rendering": interrupt_playing(word_s, cache_dir),
+            "drop queued replies": drop_queued(word_s),
+        }
+    for name, (expected, seen, stop_threads) in scenarios.items():
+        ok = seen == expected and stop_threads <= {"speech-worker"}
+        print(f"{name:>28}: {' '.join(f'{k}={v}' for k, v in seen.items())}  {'ok' if ok else 'WRONG'}")
+        if not ok:
+            failures.append(f"{name}: expected {expected}, engine stopped from {sorted(stop_threads)}")
+    if failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Benchmark the streaming voice pipeline offline, without a microphone.
+#
+# A synthetic PCM stream of tone bursts separated by noisy silence stands in
+# for speech; each burst's amplitude encodes which command it "says", and
+# the fake recognizer sleeps for --recognize-ms to model decoding cost.
+#
+#   python benchmarks/bench_voice.py [--utterances 8] [--workers 2] [--processes]
+import argparse
+import functools
+import array
+import io
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice import PCMSource, VoicePipeline, summarize
+
+RATE = 16000
+COMMANDS = [
+    "turn on the light in the kitchen",
+    "what is the temperature",
+    "make pasta",
+    "lock the door",
+    "what is the status of my home",
+    "set the oven to 180 degrees",
+]
+
+def synthetic_stream(utterances, seed=7):
+    rng = random.Random(seed)
+    samples = array.array("h")
+    for i in range(utterances):
+        samples.extend(rng.randint(-60, 60) for _ in range(int(RATE * 0.6)))
+        amplitude = 2000 + 1000 * (i % len(COMMANDS))
+        samples.extend(int(amplitude * math.sin(2 * math.pi * 440 * t / RATE)) for t in range(int(RATE * 0.5)))
+    samples.extend(rng.randint(-60, 60) for _ in range(int(RATE * 0.6)))
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def fake_recognizer(audio, sample_rate, sample_width, delay=0.2):
+    samples = array.array("h", audio)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    time.sleep(delay)
+    return COMMANDS[round((max(samples) - 2000) / 1000) % len(COMMANDS)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--processes", action="store_true")
+    parser.add_argument("--recognize-ms", type=float, default=200)
+    parser.add_argument("--fast", action="store_true", help="feed audio as fast as possible instead of in real time")
+    args = parser.parse_args()
+
+    audio = synthetic_stream(args.utterances)
+    pipeline = VoicePipeline(recognizer=functools.partial(fake_recognizer, delay=args.recognize_ms / 1000), workers=args.workers, use_processes=args.processes)
+    start = time.perf_counter()
+    results = pipeline.run(PCMSource(io.BytesIO(audio), RATE, realtime=not args.fast))
+    wall = time.perf_counter() - start
+
+    expected = [COMMANDS[i % len(COMMANDS)] for i in range(args.utterances)]
+    recognized = [r.text for r in results]
+    if recognized != expected:
+        sys.exit(f"recognized {recognized}, expected {expected}")
+    audio_seconds = len(audio) / (RATE * 2)
+    print(f"{len(results)} utterances, {audio_seconds:.2f}s of audio processed in {wall:.2f}s wall")
+    for stage, values in summarize(results).items():
+        print(f"{stage:>10}: mean {values['mean'] * 1000:7.2f}ms  p50 {values['p50'] * 1000:7.2f}ms  p95 {values['p95'] * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Labelled utterance corpus for the command engine.
+#
+# Every intent in commands.patterns has a generator; each utterance is
+# labelled "<intent>", "<intent>:room" (with a room suffix),
+# "<intent>:out_of_range" (values the temperature, oven and humidifier
+# guards reject), "near_miss" (for the fuzzy fallback) or "miss". The same
+# seed always gives the same corpus, and it can be written to and replayed
+# from a JSON-lines file.
+#
+#   python benchmarks/corpus.py corpus.jsonl [--size 20000] [--seed 7]
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOMS = ["kitchen", "bedroom", "living", "garage", "garden", "office", "bathroom", "hallway"]
+TOGGLED = ["light", "tv", "fan", "speaker", "oven", "vacuum", "humidifier", "coffee_maker", "security_camera"]
+CHECKED = TOGGLED + ["door_lock", "blinds", "garage_door", "sprinkler"]
+DISHES = ["pasta", "chicken", "pizza", "salad", "cake", "soup", "lasagna", "chocolate cake", "pancakes", "curry",
+          "pasta salad", "chicken soup", "pasta tonight", "chicken for dinner", "pizza now", "soup quickly"]
+FIXED = {
+    "greeting": ["hi", "hello", "thank you"],
+    "farewell": ["finally thank you"],
+    "list_recipes": ["what recipes can you provide"],
+    "device_count": ["how many devices can you control"],
+    "all_lights_on": ["can you turn on all lights"],
+    "all_devices_off": ["can you turn off all devices"],
+    "home_status": ["what is the status of my home"],
+    "night_mode": ["can you set the home to night mode"],
+    "morning_mode": ["can you set the home to morning mode"],
+    "room_list": ["what rooms are supported"],
+    "energy_saving": ["can you help me save energy"],
+    "dinner_suggestion": ["what should i cook for dinner"],
+    "security_check": ["can you check if the house is secure"],
+    "voice_help": ["how do i use the voice feature"],
+    "capabilities": ["what can you do"],
+    "scene": ["activate movie night", "activate the away scene", "activate night mode"],
+}
+NEAR_MISSES = [
+    "switch on the light", "pls lock door", "lights on in kitchen", "open garage", "swich on the lite",
+    "turn the tv off", "night mode please", "preheat oven to 200", "play some rock",
+]
+MISSES = ["tell me a joke", "what is the weather", "where is my phone", "order a pizza", "asdf qwer", "is it raining", ""]
+
+
+def _room(rng, text, intent, share=0.4):
+    if rng.random() < share:
+        return f"{intent}:room", f"{text} in the {rng.choice(ROOMS)}"
+    return intent, text
+
+
+def _ranged(rng, intent, template, low, high, suffix):
+    value = rng.randint(low, high) if rng.random() < 0.8 else rng.choice([low - rng.randint(1, 50), high + rng.randint(1, 50)])
+    case, text = _room(rng, template.format(max(value, 0)) + (suffix if rng.random() < 0.5 else ""), intent)
+    if not low <= max(value, 0) <= high:
+        case = f"{intent}:out_of_range"
+    return case, text
+
+
+def _status_check(rng):
+    case, text = _room(rng, f"is the {rng.choice(CHECKED)}", "status_check")
+    return case, f"{text} {rng.choice(['on', 'off', 'locked', 'open', 'closed', 'playing'])}"
+
+
+GENERATORS = {
+    "device_toggle": lambda rng: _room(rng, f"turn {rng.choice(['on', 'off'])} the {rng.choice(TOGGLED)}", "device_toggle"),
+    "set_temperature": lambda rng: _ranged(rng, "set_temperature", "set the temperature to {}", 10, 30, " degrees"),
+    "specific_light_toggle": lambda rng: ("specific_light_toggle", f"turn {rng.choice(['on', 'off'])} the {rng.choice(ROOMS)} light"),
+    "door_lock": lambda rng: _room(rng, f"{rng.choice(['lock', 'unlock'])} the {rng.choice(['door', 'door_lock'])}", "door_lock"),
+    "open_close_device": lambda rng: _room(rng, f"{rng.choice(['open', 'close'])} the {rng.choice(['blinds', 'garage_door'])}", "open_close_device"),
+    "play_music": lambda rng: _room(rng, f"play {rng.choice(['jazz', 'rock', 'classical', 'pop'])} on the speaker", "play_music"),
+    "set_oven": lambda rng: _ranged(rng, "set_oven", "set the oven to {}", 100, 250, " degrees"),
+    "start_vacuum": lambda rng: _room(rng, "start the vacuum", "start_vacuum"),
+    "sprinkler_control": lambda rng: _room(rng, f"turn {rng.choice(['on', 'off'])} the sprinkler", "sprinkler_control"),
+    "set_humidifier": lambda rng: _ranged(rng, "set_humidifier", "set the humidifier to {}", 30, 70, " percent"),
+    "make_coffee": lambda rng: _room(rng, "make coffee", "make_coffee"),
+    "status_check": _status_check,
+    "temperature_check": lambda rng: _room(rng, "what is the temperature", "temperature_check"),
+    "humidity_check": lambda rng: _room(rng, "what is the humidity", "humidity_check"),
+    "oven_temp_check": lambda rng: _room(rng, "what is the oven temperature", "oven_temp_check"),
+    "cook_dish": lambda rng: _room(rng, f"{rng.choice(['make', 'cook'])} {rng.choice(DISHES)}", "cook_dish", 0.2),
+    "near_miss": lambda rng: ("near_miss", rng.choice(NEAR_MISSES)),
+    "miss": lambda rng: ("miss", rng.choice(MISSES)),
+}
+GENERATORS.update({intent: (lambda intent: lambda rng: (intent, rng.choice(FIXED[intent])))(intent) for intent in FIXED})
+
+
+# Intents in commands.patterns that have no generator
+def missing_intents():
+    from commands import patterns
+    return sorted({action for _, action, _ in patterns} - set(GENERATORS))
+
+
+# [(case, utterance), ...]; every generator is picked equally often
+def generate(size=20000, seed=7):
+    rng = random.Random(seed)
+    names = sorted(GENERATORS)
+    return [GENERATORS[names[i % len(names)]](rng) for i in rng.sample(range(size), size)]
+
+
+def save(corpus, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for case, text in corpus:
+            f.write(json.dumps({"case": case, "text": text}) + "\n")
+
+
+def load(path):
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                corpus.append((data["case"], data["text"]))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    corpus = generate(args.size, args.seed)
+    save(corpus, args.path)
+    print(f"wrote {len(corpus)} utterances in {len({case for case, _ in corpus})} cases to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import bisect
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes.jsonl")
+STOP_WORDS = {"a", "an", "the", "in", "some", "me", "please", "for"}
+LISTED_RECIPES = 20
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class Recipe:
+    __slots__ = ("id", "name", "ingredients", "steps", "youtube_urls", "size", "response")
+
+    def __init__(self, recipe_id, name, ingredients, steps, youtube_urls):
+        self.id = recipe_id
+        self.name = name
+        self.ingredients = ingredients
+        self.steps = steps
+        self.youtube_urls = youtube_urls
+        self.size = len(tokenize(name))
+        self.response = None
+
+
+# Recipe catalog with an inverted token index.
+#
+# Names and ingredients are indexed separately, token -> recipe ids (a set
+# for names, an id-ordered list for ingredients). A dish is matched by exact name first, then by intersecting the name
+# postings of its words (rarest first), preferring the shortest name. For each token the best single-word
+# match is kept up to date, so the common case is two dict lookups.
+# complete() serves prefix autocomplete from sorted name and vocabulary
+# lists, and formatted replies are cached on the recipe.
+class RecipeCatalog:
+    def __init__(self):
+        self.recipes = []
+        self._by_name = {}
+        self._name_index = {}
+        self._ingredient_index = {}
+        self._best = {}
+        self._sorted_names = None
+        self._sorted_tokens = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        catalog = cls()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    data = json.loads(line)
+                    catalog.add(data["name"], data.get("ingredients", []), data["steps"], data.get("youtube_urls", []))
+        return catalog
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def names(self):
+        return [recipe.name for recipe in self.recipes]
+
+    def add(self, name, ingredients, steps, youtube_urls=()):
+        name = " ".join(tokenize(name))
+        if not name or name in self._by_name:
+            raise ValueError(f"Duplicate or empty recipe name: {name!r}")
+        recipe = Recipe(len(self.recipes), name, list(ingredients), list(steps), list(youtube_urls))
+        self.recipes.append(recipe)
+        self._by_name[name] = recipe
+        for token in set(tokenize(name)):
+            self._name_index.setdefault(token, set()).add(recipe.id)
+            best = self._best.get(token)
+            if best is None or recipe.size < self.recipes[best].size:
+                self._best[token] = recipe.id
+        for token in {t for ingredient in recipe.ingredients for t in tokenize(ingredient)}:
+            self._ingredient_index.setdefault(token, []).append(recipe.id)
+        self._sorted_names = self._sorted_tokens = None
+        return recipe
+
+    def get(self, name):
+        return self._by_name.get(" ".join(tokenize(name)))
+
+    # Best recipe for a spoken dish name, or None. Trailing words that are in
+    # no recipe name are dropped ("pasta tonight", "chicken for dinner");
+    # every word left that is not a stop word must be in the recipe's name:
+    # "chocolate cake" does not fall back to plain "cake", and "pasta salad"
+    # matches nothing rather than either. Postings are intersected rarest
+    # first, ties in utterance order, so the answer never depends on set
+    # iteration order.
+    def match(self, dish):
+        tokens = tokenize(dish)
+        recipe = self._by_name.get(" ".join(tokens))
+        if recipe is not None:
+            return recipe
+        words = [token for token in dict.fromkeys(tokens) if token not in STOP_WORDS]
+        while words and words[-1] not in self._name_index:
+            words.pop()
+        if not words or any(token not in self._name_index for token in words):
+            return None
+        if len(words) == 1:
+            return self.recipes[self._best[words[0]]]
+        postings = sorted(((len(self._name_index[token]), i, token) for i, token in enumerate(words)))
+        result = self._name_index[postings[0][2]]
+        for _, _, token in postings[1:]:
+            result = result & self._name_index[token]
+            if not result:
+                return None
+        return self.recipes[min(result, key=lambda i: (self.recipes[i].size, i))]
+
+    # Recipes using an ingredient word, e.g. "eggs"
+    def with_ingredient(self, word, limit=10):
+        postings = [self._ingredient_index[t] for t in set(tokenize(word)) if t in self._ingredient_index]
+        ids = heapq.merge(*postings)
+        return [self.recipes[i] for i, _ in itertools.islice(itertools.groupby(ids), limit)]
+
+    def _ensure_sorted(self):
+        with self._lock:
+            if self._sorted_names is None:
+                self._sorted_names = sorted(self._by_name)
+                self._sorted_tokens = sorted(self._name_index)
+
+    # Recipe names starting with prefix, then names with a word starting
+    # with it
+    def complete(self, prefix, limit=10):
+        self._ensure_sorted()
+        prefix = " ".join(tokenize(prefix)) + (" " if prefix.endswith(" ") else "")
+        if not prefix.strip():
+            return []
+        results = []
+        names = self._sorted_names
+        i = bisect.bisect_left(names, prefix)
+        while i < len(names) and len(results) < limit and names[i].startswith(prefix):
+            results.append(names[i])
+            i += 1
+        seen = set(results)
+        tokens = self._sorted_tokens
+        word = prefix.split()[-1]
+        j = bisect.bisect_left(tokens, word)
+        while j < len(tokens) and len(results) < limit and tokens[j].startswith(word):
+            for recipe_id in sorted(self._name_index[tokens[j]]):
+                name = self.recipes[recipe_id].name
+                if name not in seen:
+                    seen.add(name)
+                    results.append(name)
+                    if len(results) >= limit:
+                        break
+            j += 1
+        return results
+
+    def response(self, recipe):
+        if recipe.response is None:
+            steps = "\n\n".join(f"{i+1}. {step}" for i, step in enumerate(recipe.steps))
+            recipe.response = f"### Recipe for {recipe.name.capitalize()}\n\n{steps}\n\n*Watch these YouTube videos for guidance:*"
+        return recipe.response
+
+    def listing(self):
+        names = [recipe.name for recipe in self.recipes[:LISTED_RECIPES]]
+        more = len(self.recipes) - len(names)
+        return ", ".join(names) + (f" and {more} more" if more > 0 else "")
@@ -0,0 +1,303 @@
+import threading
+from contextlib import contextmanager
+
+# Device types and the attributes a new device of each type starts with
+DEVICE_TYPES = {
+    "light": {"state": "off"},
+    "tv": {"state": "off"},
+    "thermostat": {"temperature": 22},
+    "fan": {"state": "off"},
+    "door_lock": {"state": "locked"},
+    "blinds": {"state": "closed"},
+    "speaker": {"state": "off", "playing": None},
+    "oven": {"state": "off", "temperature": 0},
+    "vacuum": {"state": "off"},
+    "garage_door": {"state": "closed"},
+    "sprinkler": {"state": "off"},
+    "humidifier": {"state": "off", "level": 50},
+    "coffee_maker": {"state": "off"},
+    "security_camera": {"state": "off"}
+}
+
+# What "turn off all devices" leaves each type at
+OFF_STATES = {device_type: dict(defaults, state=None if device_type == "thermostat" else "off") for device_type, defaults in DEVICE_TYPES.items()}
+OFF_STATES["speaker"]["playing"] = None
+
+_STRIPES = 64
+
+
+class Device:
+    __slots__ = ("id", "type", "room", "state", "temperature", "level", "playing")
+
+    def __init__(self, device_id, device_type, room=None, state=None, temperature=None, level=None, playing=None):
+        self.id = device_id
+        self.type = device_type
+        self.room = room
+        self.state = state
+        self.temperature = temperature
+        self.level = level
+        self.playing = playing
+
+    def is_off(self):
+        for name, value in OFF_STATES[self.type].items():
+            if getattr(self, name) != value:
+                return False
+        return True
+
+    def __repr__(self):
+        return f"Device({self.id}, {self.type!r}, room={self.room!r}, state={self.state!r})"
+
+
+# Registry of every device in one home.
+#
+# Devices are slotted records indexed by id, by type, by room and by
+# (type, room), so any lookup a command needs is a dict hit rather than a
+# scan. A separate index holds only the devices that are not switched off,
+# which is all that "turn off all devices" has to touch, and another groups
+# each type by state, so finding the lights that are not on yet skips the
+# ones that are.
+#
+# Structural changes (adding, removing, placing devices) take the registry
+# lock; attribute updates take one of a fixed set of lock stripes picked by
+# device id, so sessions working on different devices do not contend.
+#
+# If a journal is attached, every change is also passed to
+# journal.record() as an event tuple, and then to each callback in
+# watchers, while the lock that guards the change is still held; apply()
+# replays such events. batch() changes many devices as one atomic step and
+# one event. views holds derived data kept current by watchers.
+class DeviceRegistry:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.journal = None
+        self.watchers = []
+        self.views = {}
+        self._stripes = [threading.Lock() for _ in range(_STRIPES)]
+        self._next_id = 1
+        self._by_id = {}
+        self._by_type = {device_type: {} for device_type in DEVICE_TYPES}
+        self._by_room = {}
+        self._by_type_room = {}
+        self._active = {device_type: {} for device_type in DEVICE_TYPES}
+        self._by_state = {device_type: {} for device_type in DEVICE_TYPES}
+        self._current = {}
+
+    # A home with one unplaced device of every type, like the original demo
+    @classmethod
+    def with_defaults(cls):
+        registry = cls()
+        for device_type in DEVICE_TYPES:
+            registry.add(device_type)
+        return registry
+
+    def __len__(self):
+        return len(self._by_id)
+
+    @property
+    def next_id(self):
+        return self._next_id
+
+    @next_id.setter
+    def next_id(self, value):
+        with self.lock:
+            self._next_id = max(self._next_id, value)
+
+    def add(self, device_type, room=None, device_id=None, **attrs):
+        if device_type not in DEVICE_TYPES:
+            raise ValueError(f"Unknown device type: {device_type}")
+        with self.lock:
+            if device_id is None:
+                device_id = self._next_id
+            self._next_id = max(self._next_id, device_id + 1)
+            attrs = dict(DEVICE_TYPES[device_type], **attrs)
+            device = Device(device_id, device_type, room, **attrs)
+            self._by_id[device.id] = device
+            self._by_type[device_type][device.id] = device
+            self._index_room(device)
+            self._by_state[device_type].setdefault(device.state, {})[device.id] = device
+            self._current.setdefault(device_type, device)
+            if not device.is_off():
+                self._active[device_type][device.id] = device
+            self._notify(("add", device.id, device_type, room, attrs))
+            return device
+
+    def remove(self, device_id):
+        with self.lock:
+            device = self._by_id.pop(device_id)
+            del self._by_type[device.type][device.id]
+            self._unindex_room(device)
+            self._active[device.type].pop(device.id, None)
+            del self._by_state[device.type][device.state][device.id]
+            if self._current.get(device.type) is device:
+                remaining = self._by_type[device.type]
+                if remaining:
+                    self._current[device.type] = next(iter(remaining.values()))
+                else:
+                    del self._current[device.type]
+            self._notify(("remove", device_id))
+            return device
+
+    def get(self, device_id):
+        return self._by_id.get(device_id)
+
+    def by_type(self, device_type):
+        with self.lock:
+            return list(self._by_type.get(device_type, {}).values())
+
+    def by_room(self, room):
+        with self.lock:
+            return list(self._by_room.get(room, {}).values())
+
+    def rooms(self):
+        with self.lock:
+            return [room for room in self._by_room if room is not None]
+
+    # Devices of a type in a room, without creating anything
+    def find(self, device_type, room):
+        with self.lock:
+            return list(self._by_type_room.get((device_type, room), {}).values())
+
+    # Device of a type addressed most recently; commands without a room
+    # act on it, just as they acted on the single device before
+    def current(self, device_type):
+        return self._current.get(device_type)
+
+    # Devices that are not switched off, of one type or of every type
+    def active(self, device_type=None):
+        with self.lock:
+            if device_type is not None:
+                return list(self._active.get(device_type, {}).values())
+            return [device for devices in self._active.values() for device in list(devices.values())]
+
+    # Devices of a type whose state is not `state`
+    def not_in_state(self, device_type, state):
+        with self.lock:
+            return [
+                device for value, bucket in self._by_state.get(device_type, {}).items() if value != state
+                for device in list(bucket.values())
+            ]
+
+    # Devices a command should act on. Without a room that is the current
+    # device of the type. With a room it is every device of the type in
+    # that room; if there are none, an unplaced current device is placed
+    # there, otherwise a new device is added to the room.
+    def target(self, device_type, room=None):
+        with self.lock:
+            if room is None:
+                current = self._current.get(device_type)
+                return [current] if current is not None else [self.add(device_type)]
+            devices = list(self._by_type_room.get((device_type, room), {}).values())
+            if not devices:
+                current = self._current.get(device_type)
+                if current is not None and current.room is None:
+                    self.move(current, room)
+                    devices = [current]
+                else:
+                    devices = [self.add(device_type, room)]
+            self._set_current(devices[0])
+            return devices
+
+    def _set_current(self, device):
+        if self._current.get(device.type) is not device:
+            self._current[device.type] = device
+            self._notify(("current", device.type, device.id))
+
+    def move(self, device, room):
+        with self.lock:
+            self._unindex_room(device)
+            device.room = room
+            self._index_room(device)
+            self._notify(("move", device.id, room))
+
+    def update(self, device, **changes):
+        with self._stripes[device.id % _STRIPES]:
+            self._change(device, changes)
+            self._notify(("update", device.id, changes))
+
+    # Change many devices at once: plan(registry) returns (device, changes)
+    # pairs and runs, like the changes themselves, with every lock held, so
+    # no reader that takes a lock sees the batch half applied. The whole
+    # batch is a single "batch" event.
+    def batch(self, plan):
+        with self.frozen():
+            updates = plan(self)
+            for device, changes in updates:
+                self._change(device, changes)
+            if updates:
+                self._notify(("batch", [[device.id, changes] for device, changes in updates]))
+            return updates
+
+    # State buckets are never deleted when they empty, so updates under
+    # different stripes never race on removing one
+    def _change(self, device, changes):
+        state = device.state
+        for name, value in changes.items():
+            setattr(device, name, value)
+        if device.state != state:
+            states = self._by_state[device.type]
+            del states[state][device.id]
+            states.setdefault(device.state, {})[device.id] = device
+        if device.is_off():
+            self._active[device.type].pop(device.id, None)
+        else:
+            self._active[device.type][device.id] = device
+
+    def _notify(self, event):
+        if self.journal is not None:
+            self.journal.record(event)
+        for watcher in self.watchers:
+            watcher(event)
+
+    # Replay one journal event
+    def apply(self, event):
+        kind = event[0]
+        if kind == "update":
+            self.update(self._by_id[event[1]], **event[2])
+        elif kind == "add":
+            self.add(event[2], event[3], device_id=event[1], **event[4])
+        elif kind == "move":
+            self.move(self._by_id[event[1]], event[2])
+        elif kind == "batch":
+            self.batch(lambda registry: [(self._by_id[device_id], changes) for device_id, changes in event[1]])
+        elif kind == "current":
+            self._set_current(self._by_id[event[2]])
+        elif kind == "remove":
+            self.remove(event[1])
+        else:
+            raise ValueError(f"Unknown journal event: {kind}")
+
+    # Hold every lock, so nothing changes while the caller reads the whole
+    # registry (e.g. to write a snapshot)
+    @contextmanager
+    def frozen(self):
+        with self.lock:
+            for stripe in self._stripes:
+                stripe.acquire()
+            try:
+                yield self
+            finally:
+                for stripe in reversed(self._stripes):
+                    stripe.release()
+
+    def devices(self):
+        with self.lock:
+            return list(self._by_id.values())
+
+    def current_ids(self):
+        with self.lock:
+            return {device_type: device.id for device_type, device in self._current.items()}
+
+    def _index_room(self, device):
+        self._by_room.setdefault(device.room, {})[device.id] = device
+        self._by_type_room.setdefault((device.type, device.room), {})[device.id] = device
+
+    def _unindex_room(self, device):
+        room = self._by_room[device.room]
+        del room[device.id]
+        if not room:
+            del self._by_room[device.room]
+        key = (device.type, device.room)
+        bucket = self._by_type_room[key]
+        del bucket[device.id]
+        if not bucket:
+            del self._by_type_room[key]
@@ -0,0 +1,262 @@
+import math
+import re
+import threading
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from devices import DEVICE_TYPES
+
+THRESHOLD = 0.55
+# Guesses that would work the door lock or the garage door need more
+SENSITIVE_THRESHOLD = 0.75
+NGRAM_SIZES = (2, 3, 4)
+
+Guess = namedtuple("Guess", "action example groups score phrase")
+
+# Intents that change devices. A negated utterance ("dont unlock the door")
+# is never guessed as one of these, nor as a status check, which is what a
+# negated command otherwise tends to look like.
+OPERATING_INTENTS = {
+    "device_toggle", "sprinkler_control", "door_lock", "open_close_device", "set_temperature", "set_oven",
+    "set_humidifier", "play_music", "start_vacuum", "make_coffee", "all_lights_on", "all_devices_off",
+    "night_mode", "morning_mode",
+}
+
+TOGGLE_DEVICES = ("light", "tv", "fan", "speaker", "oven", "vacuum", "humidifier", "coffee_maker", "security_camera")
+
+# Spoken names for each device type, longest first when matching
+DEVICE_ALIASES = {
+    "security camera": "security_camera", "coffee maker": "coffee_maker", "coffee machine": "coffee_maker",
+    "garage door": "garage_door", "door lock": "door_lock", "front door": "door_lock",
+    "lights": "light", "light": "light", "lite": "light", "lamps": "light", "lamp": "light",
+    "television": "tv", "telly": "tv", "tv": "tv", "fan": "fan", "speakers": "speaker", "speaker": "speaker",
+    "oven": "oven", "vacuum": "vacuum", "hoover": "vacuum", "roomba": "vacuum", "humidifier": "humidifier",
+    "camera": "security_camera", "cameras": "security_camera", "cctv": "security_camera",
+    "door": "door_lock", "blinds": "blinds", "shades": "blinds", "curtains": "blinds",
+    "garage": "garage_door", "sprinklers": "sprinkler", "sprinkler": "sprinkler", "thermostat": "thermostat",
+}
+DEVICE_ALIASES.update({device_type: device_type for device_type in DEVICE_TYPES})
+_ALIAS = re.compile(r"\b(" + "|".join(sorted(map(re.escape, DEVICE_ALIASES), key=len, reverse=True)) + r")\b")
+_STATE = re.compile(r"\b(on|off|unlock|lock|open|close|shut)\b")
+_ROOM = re.compile(r"\bin (?:the )?(\w+)")
+_NUMBER = re.compile(r"(\d+)")
+_MUSIC = re.compile(r"\bplay (?:some |me |my )?(\w+)")
+_NEGATION = re.compile(r"\b(?:not|don'?t|don’t|dont|never|no)\b")
+# An utterance that starts by telling a device what to do, not asking about it
+_COMMAND = re.compile(r"^(?:(?:please|pls|can you|could you) )*(?:turn|switch|put|power|open|close|shut|lock|unlock)\b")
+_DISH = re.compile(r"\b(?:make|cook|prepare|recipe for|how to make|how do i make|how do i cook) (?:a |an |some |me |the )?(.+?)(?: in (?:the )?(\w+))?$")
+
+# Canonical phrasings of every intent, each with an example the regular
+# patterns understand (static replies are looked up through it).
+# {device}/{state} are expanded over the devices and states the intent
+# accepts; "#" stands for any number.
+INTENT_PHRASES = [
+    ("greeting", "hello", ["hey", "hey there", "good morning", "good evening", "hiya", "greetings"]),
+    ("greeting", "thank you", ["thanks", "thanks a lot", "thank u", "many thanks", "cheers"]),
+    ("device_toggle", "turn on the light", ["turn {state} the {device}", "switch {state} the {device}", "turn the {device} {state}", "switch the {device} {state}",
+                                            "{device} {state}", "put the {device} {state}", "power {state} the {device}", "can you turn {state} the {device}"]),
+    ("sprinkler_control", "turn on the sprinkler", ["switch {state} the sprinkler", "turn the sprinkler {state}", "sprinkler {state}", "sprinklers {state}"]),
+    ("set_temperature", "set the temperature to 22", ["set temperature to #", "set the thermostat to #", "make it # degrees", "thermostat to #", "change the temperature to # degrees", "temperature #"]),
+    ("door_lock", "lock the door", ["lock door", "unlock door", "lock the front door", "unlock the front door", "please lock the door", "door lock", "pls lock door"]),
+    ("open_close_device", "open the blinds", ["open blinds", "close blinds", "open garage", "close garage", "shut the garage door", "open the shades", "close the curtains"]),
+    ("play_music", "play jazz on the speaker", ["play some jazz", "play music", "play rock on the speakers", "put on some music", "play my playlist"]),
+    ("set_oven", "set the oven to 180", ["preheat the oven to #", "oven to # degrees", "heat the oven to #", "set oven #"]),
+    ("start_vacuum", "start the vacuum", ["vacuum the floor", "start vacuuming", "run the vacuum", "start the roomba", "clean the floor"]),
+    ("set_humidifier", "set the humidifier to 45", ["humidifier to # percent", "set humidity to #", "set the humidity to # percent", "humidity #"]),
+    ("make_coffee", "make coffee", ["brew coffee", "brew some coffee", "start the coffee maker", "i need coffee", "coffee please", "make me a coffee"]),
+    ("status_check", "is the light on", ["is the {device} {state}", "are the {device} {state}", "{device} status", "check the {device}", "status of the {device}"]),
+    ("temperature_check", "what is the temperature", ["whats the temperature", "how warm is it", "how hot is it", "how cold is it", "current temperature", "temperature please"]),
+    ("humidity_check", "what is the humidity", ["whats the humidity", "how humid is it", "humidity level", "current humidity"]),
+    ("oven_temp_check", "what is the oven temperature", ["whats the oven temperature", "how hot is the oven", "oven temperature"]),
+    ("farewell", "finally thank you", ["thats all thanks", "bye", "goodbye", "see you later"]),
+    ("cook_dish", "make pasta", ["recipe for pasta", "how do i make pizza", "how to cook soup", "prepare salad", "cook me some chicken", "make a cake"]),
+    ("list_recipes", "what recipes can you provide", ["what recipes do you have", "list recipes", "show me the recipes", "which recipes do you know"]),
+    ("device_count", "how many devices can you control", ["how many devices", "how many devices do you control", "number of devices"]),
+    ("all_lights_on", "can you turn on all lights", ["turn on all lights", "all lights on", "switch on all the lights", "turn all the lights on"]),
+    ("all_devices_off", "can you turn off all devices", ["turn off all devices", "turn everything off", "switch off everything", "all devices off"]),
+    ("home_status", "what is the status of my home", ["home status", "status of my home", "how is my home", "show home status", "status report"]),
+    ("night_mode", "can you set the home to night mode", ["night mode", "good night", "set night mode", "activate night mode"]),
+    ("morning_mode", "can you set the home to morning mode", ["morning mode", "set morning mode", "activate morning mode", "wake up the house"]),
+    ("room_list", "what rooms are supported", ["which rooms", "list rooms", "what rooms can you control"]),
+    ("energy_saving", "can you help me save energy", ["how can i save energy", "energy saving tips", "save energy", "reduce my power bill"]),
+    ("dinner_suggestion", "what should i cook for dinner", ["what should i eat", "dinner ideas", "what to cook tonight", "suggest dinner"]),
+    ("security_check", "can you check if the house is secure", ["is the house secure", "security check", "is my home safe", "check security", "is everything locked"]),
+    ("voice_help", "how do i use the voice feature", ["how does voice work", "voice help", "how to use voice", "how do i talk to you"]),
+    ("capabilities", "what can you do", ["what can you help with", "help", "what are your features", "what do you do"]),
+]
+
+_STATES = {
+    "device_toggle": ("on", "off"),
+    "sprinkler_control": ("on", "off"),
+    "status_check": ("on", "off", "locked", "open", "closed"),
+}
+_DEVICES = {
+    "device_toggle": ("light", "lights", "tv", "television", "fan", "speaker", "oven", "vacuum", "humidifier", "coffee maker", "security camera"),
+    "status_check": ("light", "lights", "tv", "fan", "speaker", "oven", "door", "blinds", "garage door", "sprinkler", "camera"),
+}
+
+
+def normalize(text):
+    text = _NUMBER.sub("#", text.lower())
+    return " ".join(re.sub(r"[^\w#]+", " ", text).split())
+
+
+def _ngrams(text):
+    text = f" {normalize(text)} "
+    return Counter(text[i:i + n] for n in NGRAM_SIZES for i in range(len(text) - n + 1))
+
+
+def _expand(action, phrase):
+    phrases = [phrase]
+    if "{device}" in phrase:
+        phrases = [p.replace("{device}", device) for p in phrases for device in _DEVICES[action]]
+    if "{state}" in phrase:
+        phrases = [p.replace("{state}", state) for p in phrases for state in _STATES[action]]
+    return phrases
+
+
+def _find_device(text):
+    match = _ALIAS.search(text)
+    return DEVICE_ALIASES[match.group(1)] if match else None
+
+
+def _find(pattern, text):
+    match = pattern.search(text)
+    return match.group(1) if match else None
+
+
+def _state(text):
+    state = _find(_STATE, text)
+    return "close" if state == "shut" else state
+
+
+# Turn a guessed intent plus the raw utterance into the (action, groups) the
+# regular handler for that intent expects, or None if a required slot is
+# missing. Toggle-style commands are rerouted by the device they name.
+def extract_slots(action, text):
+    room = _find(_ROOM, text)
+    if room is not None and room in DEVICE_ALIASES:
+        room = None
+    device = _find_device(text)
+    state = _state(text)
+    number = _find(_NUMBER, text)
+    if action in ("device_toggle", "sprinkler_control", "door_lock", "open_close_device"):
+        if device == "sprinkler" and state in ("on", "off"):
+            return "sprinkler_control", (state, "sprinkler", room)
+        if device == "door_lock" or state in ("lock", "unlock"):
+            return ("door_lock", (state, "door", room)) if state in ("lock", "unlock") else None
+        if device in ("blinds", "garage_door"):
+            return ("open_close_device", (state, device, room)) if state in ("open", "close") else None
+        if device in TOGGLE_DEVICES and state in ("on", "off"):
+            return "device_toggle", (state, device, room)
+        return None
+    if action in ("set_temperature", "set_oven", "set_humidifier"):
+        return (action, (number, room)) if number else None
+    if action == "play_music":
+        return action, (_find(_MUSIC, text) or "music", "speaker", room)
+    if action == "start_vacuum":
+        return action, ("vacuum", room)
+    if action in ("make_coffee", "temperature_check", "humidity_check", "oven_temp_check"):
+        return action, (room,)
+    if action == "status_check":
+        # "open the door" is a command no action intent could carry out,
+        # not a question about the door
+        if device is None or device == "thermostat" or _COMMAND.search(text):
+            return None
+        queried = _find(re.compile(r"\b(on|off|locked|unlocked|open|closed|playing)\b"), text)
+        return action, (device, room, queried)
+    if action == "cook_dish":
+        match = _DISH.search(text)
+        return (action, (match.group(1), match.group(2))) if match else None
+    # "all lights off" looks like "all lights on"; never do the opposite
+    if action == "all_lights_on" and state not in (None, "on"):
+        return None
+    if action == "all_devices_off" and state not in (None, "off"):
+        return None
+    return action, ()
+
+
+# Whether a guess with these slots may be acted on
+def _allowed(action, groups, score, negated):
+    if negated and (action in OPERATING_INTENTS or action == "status_check"):
+        return False
+    if action == "door_lock" or (action == "open_close_device" and groups[1] == "garage_door"):
+        return score >= SENSITIVE_THRESHOLD
+    return True
+
+
+# Fuzzy intent classifier for utterances the regular patterns miss.
+#
+# Every canonical phrase is embedded as a TF-IDF vector over character
+# 2-4-grams and the L2-normalized rows are stacked into one matrix, so
+# scoring an utterance (or a whole batch of them) against every phrase is a
+# single matrix product. The best phrase above THRESHOLD gives the intent;
+# its slots are then pulled out of the utterance itself. Negated commands
+# and weak guesses at the lock or garage door are rejected (see _allowed).
+class IntentClassifier:
+    def __init__(self, phrases=INTENT_PHRASES, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.labels = []
+        rows = []
+        for action, example, templates in phrases:
+            for template in templates:
+                for phrase in _expand(action, template):
+                    self.labels.append((action, example, phrase))
+                    rows.append(_ngrams(phrase))
+        self.vocabulary = {}
+        document_frequency = Counter()
+        for row in rows:
+            document_frequency.update(row.keys())
+        for gram in document_frequency:
+            self.vocabulary[gram] = len(self.vocabulary)
+        self.idf = np.array(
+            [math.log((1 + len(rows)) / (1 + document_frequency[gram])) + 1 for gram in self.vocabulary],
+            dtype=np.float32,
+        )
+        self.matrix = self._embed(rows)
+
+    def _embed(self, rows):
+        vectors = np.zeros((len(rows), len(self.vocabulary)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            for gram, count in row.items():
+                index = self.vocabulary.get(gram)
+                if index is not None:
+                    vectors[i, index] = 1 + math.log(count)
+        vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    # Best Guess for each utterance, or None where nothing scores high enough
+    def classify_many(self, utterances):
+        texts = [" ".join(u.lower().split()) for u in utterances]
+        scores = self._embed([_ngrams(text) for text in texts]) @ self.matrix.T
+        best = scores.argmax(axis=1)
+        guesses = []
+        for text, row, index in zip(texts, scores, best):
+            score = float(row[index])
+            guess = None
+            if score >= self.threshold:
+                action, example, phrase = self.labels[index]
+                slots = extract_slots(action, text)
+                if slots is not None and _allowed(slots[0], slots[1], score, _NEGATION.search(text) is not None):
+                    guess = Guess(slots[0], example, slots[1], score, phrase)
+            guesses.append(guess)
+        return guesses
+
+    def classify(self, utterance):
+        return self.classify_many([utterance])[0]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+# Shared classifier, built on first use
+def get_classifier():
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = IntentClassifier()
+        return _classifier
@@ -0,0 +1,95 @@
+import functools
+import html
+import json
+import os
+import re
+import threading
+from array import array
+from collections import deque
+
+CAPACITY = 200
+PAGE_SIZE = 20
+EMBED_CACHE = 512
+
+_YOUTUBE = re.compile(r"(?:youtu\.be/|youtube\.com/(?:watch\?(?:.*&)?v=|embed/|shorts/))([\w-]{11})")
+
+
+# Player markup for a video URL, built once per URL: YouTube links become an
+# embedded player, anything else a plain <video>
+@functools.lru_cache(maxsize=EMBED_CACHE)
+def render_embed(url):
+    match = _YOUTUBE.search(url)
+    if match:
+        return (f'<iframe class="video" src="https://www.youtube.com/embed/{match.group(1)}" '
+                'allowfullscreen loading="lazy"></iframe>')
+    return f'<video class="video" controls preload="none" src="{html.escape(url, quote=True)}"></video>'
+
+
+def render_message(role, text, media=()):
+    if role == "user":
+        return f'<div class="user-message"><span class="icon">👤</span>{text}</div>'
+    videos = "".join(render_embed(url) for url in media)
+    return f'<div class="assistant-message"><span class="icon">🤖</span>{text}</div>' + (
+        f'<div class="media">{videos}</div>' if videos else ""
+    )
+
+
+# Chat history with a bounded in-memory ring buffer.
+#
+# The newest `capacity` messages stay in memory together with their
+# rendered HTML, video embeds included. Older ones are dropped, or, with a spill_path, appended to
+# a JSON-lines file whose line offsets are kept so any page of old history
+# can be read back without scanning the file.
+class MessageStore:
+    def __init__(self, capacity=CAPACITY, spill_path=None):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self._recent = deque()
+        self._offsets = array("Q")
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._dropped + len(self._offsets) + len(self._recent)
+
+    def append(self, role, text, media=()):
+        with self._lock:
+            self._recent.append((role, text, media, render_message(role, text, media)))
+            if len(self._recent) > self.capacity:
+                role, text, media, _ = self._recent.popleft()
+                if self.spill_path is None:
+                    self._dropped += 1
+                else:
+                    with open(self.spill_path, "ab") as f:
+                        self._offsets.append(f.tell())
+                        f.write(json.dumps([role, text, list(media)]).encode("utf-8") + b"\n")
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._offsets = array("Q")
+            self._dropped = 0
+            if self.spill_path is not None and os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
+
+    # The last `count` messages, oldest first, as (role, text, media, html)
+    def window(self, count):
+        with self._lock:
+            recent = list(self._recent)[-count:] if count else []
+            older = count - len(recent)
+            if older <= 0 or not self._offsets:
+                return recent
+            return self._read_spilled(max(0, len(self._offsets) - older), len(self._offsets)) + recent
+
+    def _read_spilled(self, start, end):
+        messages = []
+        with open(self.spill_path, "rb") as f:
+            f.seek(self._offsets[start])
+            for _ in range(start, end):
+                role, text, media = json.loads(f.readline())
+                messages.append((role, text, tuple(media), render_message(role, text, media)))
+        return messages
+
+    # The last `count` messages as one HTML block
+    def render(self, count):
+        return '<div class="chat-container">' + "".join(markup for *_, markup in self.window(count)) + "</div>"
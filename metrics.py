@@ -0,0 +1,227 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (
+    5e-6, 10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3,
+    500e-3, 1.0, 2.5, 5.0, 10.0,
+)
+PROFILE_DEPTH = 48
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    # Upper bound of the bucket holding quantile q (inf past the last one)
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self):
+        return {
+            "count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+        }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_histogram(lines, name, label, histograms):
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{_label(key)}",le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label}="{_label(key)}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}="{_label(key)}"}} {histogram.sum:.9f}')
+        lines.append(f'{name}_count{{{label}="{_label(key)}"}} {histogram.count}')
+
+
+# Statistical profiler: a daemon thread that wakes every `interval` seconds
+# and records the Python stack of every other thread, root first, as one
+# "file:function:line;..." key. Costs nothing while stopped; folded() output
+# feeds straight into flamegraph tools.
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=None):
+        with self._lock:
+            if interval is not None:
+                self.interval = interval
+            if self._thread is None:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks = Counter()
+            self.samples = 0
+
+    def _run(self, stop):
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    # The most sampled stacks as (stack, count)
+    def top(self, limit=20):
+        with self._lock:
+            return self._stacks.most_common(limit)
+
+    def folded(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+
+# Request-path metrics: a latency histogram per stage (respond, render,
+# speak, ...) and per intent, plus plain event counters. Recording is
+# a bisect into fixed buckets under one lock, so it can stay on in
+# production; set enabled to False to make it a no-op. Exported as
+# Prometheus text or a JSON-ready snapshot.
+class Metrics:
+    def __init__(self):
+        self.enabled = True
+        self.started = time.time()
+        self.profiler = SamplingProfiler()
+        self._stages = {}
+        self._intents = {}
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            with self._lock:
+                histogram = self._stages.get(stage)
+                if histogram is None:
+                    histogram = self._stages[stage] = Histogram()
+                histogram.observe(seconds)
+
+    def observe_intent(self, intent, seconds):
+        if self.enabled:
+            with self._lock:
+                histogram = self._intents.get(intent)
+                if histogram is None:
+                    histogram = self._intents[intent] = Histogram()
+                histogram.observe(seconds)
+
+    def count(self, event, amount=1):
+        if self.enabled:
+            with self._lock:
+                self._counters[event] += amount
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self._intents = {}
+            self._counters = Counter()
+        self.profiler.reset()
+
+    def snapshot(self, profile_limit=20):
+        with self._lock:
+            snapshot = {
+                "uptime": time.time() - self.started,
+                "stages": {stage: h.as_dict() for stage, h in self._stages.items()},
+                "intents": {intent: h.as_dict() for intent, h in self._intents.items()},
+                "counters": dict(self._counters),
+            }
+        snapshot["profiler"] = {
+            "running": self.profiler.running, "interval": self.profiler.interval, "samples": self.profiler.samples,
+            "top": [{"stack": stack, "count": count} for stack, count in self.profiler.top(profile_limit)],
+        }
+        return snapshot
+
+    def prometheus(self):
+        lines = [
+            "# HELP home_stage_seconds Time spent in each stage of the request path.",
+            "# TYPE home_stage_seconds histogram",
+        ]
+        with self._lock:
+            _prometheus_histogram(lines, "home_stage_seconds", "stage", self._stages)
+            lines += [
+                "# HELP home_intent_seconds Command handling time per intent.",
+                "# TYPE home_intent_seconds histogram",
+            ]
+            _prometheus_histogram(lines, "home_intent_seconds", "intent", self._intents)
+            lines += ["# HELP home_events_total Request path events.", "# TYPE home_events_total counter"]
+            lines += [f'home_events_total{{event="{_label(event)}"}} {count}' for event, count in sorted(self._counters.items())]
+        lines += [
+            "# HELP home_profiler_samples_total Sampling profiler wake-ups.",
+            "# TYPE home_profiler_samples_total counter",
+            f"home_profiler_samples_total {self.profiler.samples}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+# Process-wide metrics, shared by the app, the server and every session
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
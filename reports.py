@@ -0,0 +1,80 @@
+import threading
+
+from devices import DEVICE_TYPES
+
+BLOCK_SIZE = 256
+
+
+# Text report over a registry's devices that is maintained incrementally.
+#
+# Every device keeps its rendered fragment. Registry watchers only mark the
+# changed device dirty; text() re-renders just the dirty devices. Fragments
+# are grouped per type into blocks of BLOCK_SIZE whose joined text is cached
+# too, so assembling the report touches the changed blocks plus one string
+# per block, and an unchanged report is returned as is. Rendering holds the
+# registry lock, so a batch of changes shows up either whole or not at all.
+class StatusReport:
+    def __init__(self, registry, render, separator, types=None):
+        self.registry = registry
+        self.render = render
+        self.separator = separator
+        self.types = [t for t in DEVICE_TYPES if types is None or t in types]
+        self._blocks = {device_type: [] for device_type in self.types}
+        self._slots = {}
+        self._dirty = {}
+        self._text = None
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+        self.rendered = 0
+        with registry.lock:
+            registry.watchers.append(self._watch)
+            for device in registry.devices():
+                if device.type in self._blocks:
+                    self._dirty[device.id] = None
+
+    def _watch(self, event):
+        kind = event[0]
+        if kind == "current" or (kind == "add" and event[2] not in self._blocks):
+            return
+        with self._lock:
+            if kind == "batch":
+                for device_id, _ in event[1]:
+                    self._dirty[device_id] = None
+            else:
+                self._dirty[event[1]] = None
+
+    def text(self):
+        with self._render_lock, self.registry.lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if dirty or self._text is None:
+                stale = {}
+                for device_id in dirty:
+                    self._refresh(device_id, stale)
+                for block in stale.values():
+                    block[1] = self.separator.join(line for line in block[0] if line)
+                self._text = self.separator.join(
+                    block[1] for device_type in self.types for block in self._blocks[device_type] if block[1]
+                )
+            return self._text
+
+    def _refresh(self, device_id, stale):
+        device = self.registry.get(device_id)
+        slot = self._slots.get(device_id)
+        if slot is None:
+            if device is None or device.type not in self._blocks:
+                return
+            blocks = self._blocks[device.type]
+            if not blocks or len(blocks[-1][0]) >= BLOCK_SIZE:
+                blocks.append([[], ""])
+            block = blocks[-1]
+            block[0].append(None)
+            slot = self._slots[device_id] = (block, len(block[0]) - 1)
+        block, position = slot
+        if device is None:
+            del self._slots[device_id]
+            block[0][position] = None
+        else:
+            block[0][position] = self.render(device)
+            self.rendered += 1
+        stale[id(block)] = block
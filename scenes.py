@@ -0,0 +1,121 @@
+import json
+import os
+
+from devices import DEVICE_TYPES, OFF_STATES
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenes.jsonl")
+ATTRIBUTES = ("state", "temperature", "level", "playing")
+
+# Scenes as data. Each rule sets attributes on every device of a type
+# ("*" for all types), optionally only in one room; "set": "off" means the
+# type's OFF_STATES.
+BUILTIN_SCENES = [
+    {"name": "all lights on", "rules": [{"type": "light", "set": {"state": "on"}}]},
+    {"name": "all devices off", "rules": [{"type": "*", "set": "off"}]},
+    {"name": "night mode", "rules": [
+        {"type": "light", "set": {"state": "off"}},
+        {"type": "blinds", "set": {"state": "closed"}},
+        {"type": "security_camera", "set": {"state": "on"}},
+    ]},
+    {"name": "morning mode", "rules": [
+        {"type": "blinds", "set": {"state": "open"}},
+        {"type": "coffee_maker", "set": {"state": "on"}},
+        {"type": "light", "set": {"state": "on"}},
+    ]},
+]
+
+
+def scene_key(name):
+    return " ".join(name.lower().replace("_", " ").split())
+
+
+# A scene compiled into per-(type, room) deltas.
+#
+# Rules are checked and merged once, when the scene is built. Activating it
+# collects candidate devices from the registry's indexes rather than every
+# device: the active index for "off", the devices not yet in the target
+# state when only the state is set. Devices already at the target are
+# skipped and the rest change in one registry.batch(), so a large home pays
+# for the devices that actually change and readers never see a scene half
+# applied.
+class Scene:
+    def __init__(self, name, rules, response=None):
+        self.name = scene_key(name)
+        self.response = response
+        self.deltas = {}
+        for rule in rules:
+            device_types = list(DEVICE_TYPES) if rule["type"] == "*" else [rule["type"]]
+            for device_type in device_types:
+                if device_type not in DEVICE_TYPES:
+                    raise ValueError(f"Scene {name!r}: unknown device type {device_type!r}")
+                changes = OFF_STATES[device_type] if rule["set"] == "off" else rule["set"]
+                unknown = set(changes) - set(ATTRIBUTES)
+                if unknown:
+                    raise ValueError(f"Scene {name!r}: unknown attributes {sorted(unknown)}")
+                self.deltas.setdefault((device_type, rule.get("room")), {}).update(changes)
+        self._off = {key for key, changes in self.deltas.items() if changes == OFF_STATES[key[0]]}
+
+    def _candidates(self, registry, device_type, room, changes):
+        if (device_type, room) in self._off:
+            devices = registry.active(device_type)
+        elif "state" in changes and len(changes) == 1:
+            devices = registry.not_in_state(device_type, changes["state"])
+        elif room is None:
+            devices = registry.by_type(device_type)
+        else:
+            return registry.find(device_type, room)
+        return devices if room is None else [device for device in devices if device.room == room]
+
+    def _plan(self, registry):
+        pending = {}
+        for (device_type, room), changes in self.deltas.items():
+            for device in self._candidates(registry, device_type, room, changes):
+                pending.setdefault(device.id, (device, {}))[1].update(changes)
+        updates = []
+        for device, changes in pending.values():
+            changes = {name: value for name, value in changes.items() if getattr(device, name) != value}
+            if changes:
+                updates.append((device, changes))
+        return updates
+
+    # Apply the scene and return the (device, changes) pairs that changed
+    def activate(self, registry):
+        return registry.batch(self._plan)
+
+
+# Scenes by name: the built-ins plus any defined one per line in a JSON-lines
+# file ({"name": ..., "rules": [...], "response": ...}), which may also
+# redefine a built-in
+class SceneBook:
+    def __init__(self, scenes=()):
+        self._scenes = {}
+        for scene in scenes:
+            self.add(scene)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        book = cls(Scene(data["name"], data["rules"], data.get("response")) for data in BUILTIN_SCENES)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        data = json.loads(line)
+                        book.add(Scene(data["name"], data["rules"], data.get("response")))
+        return book
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def __contains__(self, name):
+        return scene_key(name) in self._scenes
+
+    def add(self, scene):
+        self._scenes[scene.name] = scene
+        return scene
+
+    def get(self, name):
+        return self._scenes.get(scene_key(name))
+
+    def names(self):
+        return list(self._scenes)
+
@@ -0,0 +1,374 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+from commands import get_assistant_result
+from devices import DeviceRegistry
+from metrics import get_metrics
+from statelog import get_home, release_home
+
+MAX_BODY = 64 * 1024
+MAX_HEADER = 16 * 1024
+HOME_ID = re.compile(r"[A-Za-z0-9_-]{1,64}$")
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+               503: "Service Unavailable"}
+
+
+# Device registries per home id, created on first use. With a state
+# directory every home is persisted in its own subdirectory, and homes left
+# unused for a while can be closed with release_idle() and are reopened from
+# disk when next needed; otherwise homes live in memory for the life of the
+# server.
+#
+# A lookup records the time and then checks the home is still there, and
+# release_idle() removes a home and then checks it was not used meanwhile,
+# so a home is never closed under a command that has just looked it up.
+class Homes:
+    def __init__(self, state_dir=None, seed=DeviceRegistry.with_defaults):
+        self.state_dir = state_dir
+        self.seed = seed
+        self._homes = {}
+        self._used = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._homes)
+
+    # The registry of a home that is already open, or None; never blocks
+    def cached(self, home_id):
+        registry = self._homes.get(home_id)
+        if registry is not None:
+            self._used[home_id] = time.monotonic()
+            if self._homes.get(home_id) is not registry:
+                return None
+        return registry
+
+    def get(self, home_id):
+        registry = self.cached(home_id)
+        if registry is None:
+            if not HOME_ID.match(home_id):
+                raise ValueError(f"Invalid home id: {home_id!r}")
+            with self._lock:
+                registry = self._homes.get(home_id)
+                if registry is None:
+                    if self.state_dir is None:
+                        registry = self.seed()
+                    else:
+                        registry = get_home(os.path.join(self.state_dir, home_id))
+                    self._used[home_id] = time.monotonic()
+                    self._homes[home_id] = registry
+        return registry
+
+    # Take over a registry built elsewhere (e.g. moved from another process)
+    def adopt(self, home_id, registry):
+        with self._lock:
+            self._homes[home_id] = registry
+
+    # Forget a home and return its registry, or None if it was never used. A
+    # persistent home is flushed and closed so another process can open it.
+    def release(self, home_id):
+        with self._lock:
+            registry = self._homes.pop(home_id, None)
+            self._used.pop(home_id, None)
+            if registry is not None and self.state_dir is not None:
+                release_home(os.path.join(self.state_dir, home_id))
+        return registry
+
+    # Close persistent homes unused for max_idle seconds and return how many.
+    # Blocks on their final fsyncs, so the server calls it in an executor.
+    def release_idle(self, max_idle):
+        if self.state_dir is None:
+            return 0
+        released = 0
+        with self._lock:
+            cutoff = time.monotonic() - max_idle
+            for home_id, used in list(self._used.items()):
+                if used > cutoff:
+                    continue
+                registry = self._homes.pop(home_id)
+                if self._used[home_id] > cutoff:
+                    self._homes[home_id] = registry
+                    continue
+                del self._used[home_id]
+                release_home(os.path.join(self.state_dir, home_id))
+                released += 1
+        return released
+
+    def close(self):
+        for home_id in list(self._homes):
+            self.release(home_id)
+
+
+# A JSON reply, or plain text (Prometheus metrics) when payload is a string
+def _response(status, payload, keep_alive=True):
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+# One client connection. Requests may be pipelined: every complete request
+# in a received chunk is answered in order and the replies go out in a
+# single write. When the transport's send buffer passes its high-water
+# mark (the client is not reading) the connection stops reading until it
+# drains, so a slow client is held back by TCP flow control instead of
+# having replies buffered without bound. A command for a persistent home
+# that is not open yet also stops reading: the home is opened in an
+# executor, off the event loop, and the connection carries on from that
+# request once it is, so replies stay in order.
+class _Connection(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b""
+        self.counted = False
+        self.writing_paused = False
+        self.opening = False
+        self.open_error = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.server.connections >= self.server.max_connections:
+            transport.write(_response(503, {"error": "Too many connections"}, keep_alive=False))
+            transport.close()
+            return
+        self.counted = True
+        self.server.connections += 1
+
+    def connection_lost(self, exc):
+        if self.counted:
+            self.server.connections -= 1
+            self.counted = False
+
+    def pause_writing(self):
+        self.writing_paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.writing_paused = False
+        if not self.opening:
+            self.transport.resume_reading()
+
+    def data_received(self, data):
+        self.buffer += data
+        if not self.opening:
+            self._process()
+
+    def _open_home(self, open_home):
+        self.opening = True
+        self.transport.pause_reading()
+        asyncio.get_running_loop().run_in_executor(None, open_home).add_done_callback(self._opened)
+
+    def _opened(self, future):
+        self.opening = False
+        self.open_error = future.exception() if not future.cancelled() else RuntimeError("server is shutting down")
+        if self.transport.is_closing():
+            return
+        if not self.writing_paused:
+            self.transport.resume_reading()
+        self._process()
+
+    def _process(self):
+        buffer = self.buffer
+        replies = []
+        keep_alive = True
+        deferred = False
+        pos = 0
+        while keep_alive:
+            end = buffer.find(b"\r\n\r\n", pos)
+            if end < 0:
+                if len(buffer) - pos > MAX_HEADER:
+                    replies.append(_response(413, {"error": "Headers too large"}, keep_alive=False))
+                    keep_alive = False
+                break
+            status, payload, keep_alive, length = self.server._parse(buffer[pos:end + 4])
+            if status == 413:
+                replies.append(_response(status, payload, keep_alive))
+                break
+            if len(buffer) < end + 4 + length:
+                keep_alive = True
+                break
+            body = buffer[end + 4:end + 4 + length]
+            if callable(payload):
+                status, payload = payload(body)
+                if status is None:
+                    if self.open_error is None:
+                        self._open_home(payload)
+                        deferred = True
+                        break
+                    status, payload = 503, {"error": f"Cannot open home: {self.open_error}"}
+                    self.open_error = None
+            pos = end + 4 + length
+            self.server.requests += 1
+            replies.append(_response(status, payload, keep_alive))
+        self.buffer = buffer[pos:]
+        if replies:
+            self.transport.write(b"".join(replies))
+        if not keep_alive and not deferred:
+            self.transport.close()
+
+
+# Headless command server: JSON over HTTP/1.1 on one asyncio event loop.
+#
+#   POST /command  {"home": "flat-2", "text": "turn on the light"}
+#                  -> {"home": "flat-2", "reply": "...", "intent": "device_toggle",
+#                      "slots": ["on", "light", null], "media": [], "changed": [1]}
+#   GET  /health   -> {"homes": 1, "connections": 3, "requests": 120}
+#   GET  /metrics  -> Prometheus text; /metrics.json for a JSON snapshot
+#   POST /profiler {"enabled": true, "interval": 0.005} -> profiler status
+#
+# Every home id gets its own device registry, so clients only ever see
+# their own home. Persistent homes are opened in an executor and closed
+# again after idle_timeout seconds without a command. Connections are kept alive and may pipeline requests
+# (see _Connection); past max_connections new clients get an immediate 503.
+class CommandServer:
+    def __init__(self, homes=None, host="127.0.0.1", port=8765, max_connections=1024, idle_timeout=300.0):
+        self.homes = homes if homes is not None else Homes()
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+        self._sweeper = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _Connection(self), self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        if self.homes.state_dir is not None and self.idle_timeout:
+            self._sweeper = loop.create_task(self._release_idle())
+        return self
+
+    async def _release_idle(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            await loop.run_in_executor(None, self.homes.release_idle, self.idle_timeout)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    # (status, payload, keep_alive, body length) for a request head; a
+    # callable payload still has to be given the body
+    def _parse(self, head):
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        if len(parts) != 3:
+            return 400, {"error": "Malformed request line"}, False, 0
+        method, path, version = parts
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            return 400, {"error": "Bad Content-Length"}, False, 0
+        if length < 0 or length > MAX_BODY:
+            return 413, {"error": "Request body too large"}, False, 0
+        if path == "/health":
+            return 200, {"homes": len(self.homes), "connections": self.connections, "requests": self.requests}, keep_alive, length
+        if path == "/metrics":
+            return 200, get_metrics().prometheus(), keep_alive, length
+        if path == "/metrics.json":
+            return 200, get_metrics().snapshot(), keep_alive, length
+        handler = {"/command": self._command, "/profiler": self._profiler}.get(path)
+        if handler is None:
+            return 404, {"error": f"Unknown path: {path}"}, keep_alive, length
+        if method != "POST":
+            return 405, {"error": "Use POST"}, keep_alive, length
+        if not length:
+            return 400, {"error": "Missing JSON body"}, keep_alive, 0
+        return 200, handler, keep_alive, length
+
+    def _command(self, body):
+        try:
+            request = json.loads(body)
+            home_id = str(request.get("home", "default"))
+            text = request["text"]
+            if not isinstance(text, str):
+                raise ValueError("text must be a string")
+            if not HOME_ID.match(home_id):
+                raise ValueError(f"Invalid home id: {home_id!r}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, {"error": f"Bad command request: {e}"}
+        registry = self.homes.cached(home_id)
+        if registry is None:
+            if self.homes.state_dir is not None:
+                return None, lambda: self.homes.get(home_id)
+            registry = self.homes.get(home_id)
+        result = get_assistant_result(text, registry)
+        return 200, {
+            "home": home_id, "reply": result.text, "intent": result.intent, "slots": result.slots,
+            "media": result.media, "changed": result.changed,
+        }
+
+    # Start or stop the sampling profiler while the server runs
+    def _profiler(self, body):
+        try:
+            request = json.loads(body)
+            interval = request.get("interval")
+            if interval is not None and not 0 < float(interval) <= 1:
+                raise ValueError("interval must be in (0, 1] seconds")
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, {"error": f"Bad profiler request: {e}"}
+        profiler = get_metrics().profiler
+        if request.get("reset"):
+            profiler.reset()
+        if request.get("enabled"):
+            profiler.start(None if interval is None else float(interval))
+        elif "enabled" in request:
+            profiler.stop()
+        return 200, {"running": profiler.running, "interval": profiler.interval, "samples": profiler.samples}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve home commands as JSON over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--state-dir", help="persist every home under this directory (default: in memory)")
+    parser.add_argument("--max-connections", type=int, default=1024)
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="close persistent homes unused this long")
+    args = parser.parse_args()
+
+    server = CommandServer(Homes(args.state_dir), args.host, args.port, args.max_connections, args.idle_timeout)
+
+    async def run():
+        await server.start()
+        print(f"listening on http://{server.host}:{server.port}", flush=True)
+        await server.serve_forever()
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"served {server.requests} requests in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
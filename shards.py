@@ -0,0 +1,393 @@
+import argparse
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from devices import DeviceRegistry
+from server import HOME_ID, Homes
+
+REPLICAS = 128
+MAX_IN_FLIGHT = 2
+IDLE_TIMEOUT = 300.0
+
+
+def _point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# Consistent hashing: every node owns `replicas` points on a 64-bit ring and
+# a key belongs to the node owning the first point at or after the key's
+# hash. Adding or removing a node only moves the keys between its points
+# and their neighbours, about 1/N of them. The hash is stable across
+# processes and runs, unlike hash().
+class HashRing:
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    def add(self, node):
+        for i in range(self.replicas):
+            point = _point(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node):
+        kept = [(point, owner) for point, owner in zip(self._points, self._nodes) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        return self._nodes[bisect.bisect(self._points, _point(key)) % len(self._points)]
+
+
+# An in-memory home as plain data, to move it to another process
+def _export(registry):
+    with registry.frozen():
+        devices = [(d.id, d.type, d.room, d.state, d.temperature, d.level, d.playing) for d in registry.devices()]
+        return devices, registry.current_ids(), registry.next_id
+
+
+def _restore(state):
+    devices, current, next_id = state
+    registry = DeviceRegistry()
+    for device_id, device_type, room, state, temperature, level, playing in devices:
+        registry.add(device_type, room, device_id=device_id, state=state, temperature=temperature, level=level,
+                     playing=playing)
+    for device_type, device_id in current.items():
+        registry.apply(("current", device_type, device_id))
+    registry.next_id = next_id
+    return registry
+
+
+# Reply to one command; a home that cannot be opened (unreadable state,
+# full disk) answers that command with an "error" result instead of taking
+# the worker and every other home on the shard down with it
+def _answer(homes, home_id, text):
+    from commands import Result, get_assistant_result
+
+    try:
+        registry = homes.get(home_id)
+    except Exception as e:
+        return Result("error", (), f"Cannot open home {home_id}: {e}", (), ())
+    return get_assistant_result(text, registry)
+
+
+# Worker process: owns the homes placed on its shard and answers messages
+# from the pool in the order they arrive. Between messages it closes
+# persistent homes that have been idle for idle_timeout seconds.
+def _serve(conn, state_dir, idle_timeout=IDLE_TIMEOUT):
+    homes = Homes(state_dir)
+    sweep_at = time.monotonic() + idle_timeout / 2
+    try:
+        while True:
+            if time.monotonic() >= sweep_at:
+                homes.release_idle(idle_timeout)
+                sweep_at = time.monotonic() + idle_timeout / 2
+            if not conn.poll(max(0.0, sweep_at - time.monotonic())):
+                continue
+            kind, payload = conn.recv()
+            if kind == "commands":
+                conn.send([_answer(homes, home_id, text) for home_id, text in payload])
+            elif kind == "export":
+                exported = {}
+                for home_id in payload:
+                    registry = homes.release(home_id)
+                    exported[home_id] = _export(registry) if registry is not None and state_dir is None else None
+                conn.send(exported)
+            elif kind == "import":
+                for home_id, state in payload.items():
+                    if state is not None:
+                        homes.adopt(home_id, _restore(state))
+                conn.send(len(payload))
+            elif kind == "stop":
+                break
+    finally:
+        homes.close()
+        conn.close()
+
+
+# One worker process and the two threads that talk to it over a pipe.
+#
+# Requests queue in an outbox; the sender thread sends everything queued as
+# one message, keeping at most MAX_IN_FLIGHT messages unanswered, so the
+# busier the worker the larger the batches. Consecutive command requests
+# are merged into one "commands" message. The pipe and the worker are both
+# first in, first out, so replies come back in the order requests were
+# queued and the receiver thread resolves their futures in that order.
+class _Shard:
+    def __init__(self, name, context, state_dir, idle_timeout=IDLE_TIMEOUT):
+        self.name = name
+        self.error = None
+        parent, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, state_dir, idle_timeout), name=name, daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self._outbox = []
+        self._in_flight = deque()
+        self._cond = threading.Condition()
+        self._sender = threading.Thread(target=self._send, name=f"{name}-send", daemon=True)
+        self._receiver = threading.Thread(target=self._receive, name=f"{name}-receive", daemon=True)
+        self._sender.start()
+        self._receiver.start()
+
+    # Queue a request and return its future. Commands are [(home_id, text), ...]
+    # and resolve to a list of Results.
+    def request(self, kind, payload):
+        future = Future()
+        with self._cond:
+            if self.error is not None:
+                raise self.error
+            self._outbox.append((kind, payload, future))
+            self._cond.notify_all()
+        return future
+
+    def _send(self):
+        while True:
+            with self._cond:
+                while self.error is None and (not self._outbox or len(self._in_flight) >= MAX_IN_FLIGHT):
+                    self._cond.wait()
+                if self.error is not None:
+                    return
+                queued, self._outbox = self._outbox, []
+            messages = []
+            for kind, payload, future in queued:
+                if kind == "commands" and messages and messages[-1][0] == "commands":
+                    messages[-1][1].extend(payload)
+                    messages[-1][2].append((future, len(payload)))
+                else:
+                    messages.append((kind, list(payload) if kind == "commands" else payload, [(future, len(payload or ()))]))
+            for kind, payload, futures in messages:
+                with self._cond:
+                    if self.error is not None:
+                        for future, _ in futures:
+                            future.set_exception(self.error)
+                        continue
+                    self._in_flight.append((kind, futures))
+                try:
+                    self.conn.send((kind, payload))
+                except (OSError, ValueError):
+                    return
+                if kind == "stop":
+                    return
+
+    def _receive(self):
+        while True:
+            try:
+                reply = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._cond:
+                kind, futures = self._in_flight.popleft()
+                self._cond.notify_all()
+            if kind == "commands":
+                start = 0
+                for future, count in futures:
+                    future.set_result(reply[start:start + count])
+                    start += count
+            else:
+                futures[0][0].set_result(reply)
+        with self._cond:
+            if self.error is None:
+                self.error = RuntimeError(f"Shard {self.name} has stopped")
+            failed = [future for _, futures in self._in_flight for future, _ in futures]
+            failed += [future for _, _, future in self._outbox if future is not None]
+            self._in_flight.clear()
+            self._outbox = []
+            self._cond.notify_all()
+        for future in failed:
+            if not future.done():
+                future.set_exception(self.error)
+
+    def close(self):
+        with self._cond:
+            if self.error is None:
+                self._outbox.append(("stop", None, Future()))
+                self._cond.notify_all()
+        self._sender.join()
+        self._receiver.join()
+        self.process.join()
+        self.conn.close()
+
+
+# Runs commands for many homes on a pool of worker processes, one GIL per
+# shard.
+#
+# Every home is placed on a shard by consistent hashing and only that shard
+# holds its devices, so commands for one home always run in one process, in
+# the order they were submitted; different homes run in parallel. map()
+# sends each shard a single batch. Adding or removing a worker moves only
+# the homes whose owner changes: the old shard hands their devices over
+# (or, with a state directory, flushes and closes their logs) after
+# finishing every command already queued for them, and the new shard takes
+# them before any later command, so per-home order holds across a
+# rebalance. With a state directory, workers also close homes that have
+# been idle for idle_timeout seconds; they reopen from disk on next use.
+#
+#   with ShardPool(workers=4) as pool:
+#       results = pool.map([("flat-2", "turn on the light"), ("flat-9", "lock the door")])
+class ShardPool:
+    def __init__(self, workers=None, state_dir=None, replicas=REPLICAS, start_method=None, idle_timeout=IDLE_TIMEOUT):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self.state_dir = state_dir
+        self.idle_timeout = idle_timeout
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a process that already has the engine and
+            # NumPy loaded, so adding one costs a fork rather than the imports
+            self._context.set_forkserver_preload(["shards", "commands", "fallback"])
+        self._ring = HashRing(replicas=replicas)
+        self._shards = {}
+        self._placement = {}
+        self._lock = threading.RLock()
+        self._next = 0
+        self.moved = 0
+        for _ in range(workers or os.cpu_count() or 1):
+            self.add_worker()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._shards)
+
+    def workers(self):
+        return list(self._shards)
+
+    # {worker: number of homes placed on it}
+    def placement(self):
+        with self._lock:
+            counts = dict.fromkeys(self._shards, 0)
+            for name in self._placement.values():
+                counts[name] += 1
+            return counts
+
+    def _owner(self, home_id):
+        name = self._placement.get(home_id)
+        if name is None:
+            if not HOME_ID.match(home_id):
+                raise ValueError(f"Invalid home id: {home_id!r}")
+            name = self._placement[home_id] = self._ring.node_for(home_id)
+        return name
+
+    # Future of one command's Result
+    def submit(self, home_id, text):
+        with self._lock:
+            future = self._shards[self._owner(home_id)].request("commands", [(home_id, text)])
+        result = Future()
+        future.add_done_callback(lambda done: result.set_exception(done.exception()) if done.exception()
+                                 else result.set_result(done.result()[0]))
+        return result
+
+    # Results for [(home_id, text), ...], in the same order
+    def map(self, commands):
+        batches = {}
+        with self._lock:
+            for index, (home_id, text) in enumerate(commands):
+                name = self._owner(home_id)
+                batch = batches.get(name)
+                if batch is None:
+                    batch = batches[name] = ([], [])
+                batch[0].append(index)
+                batch[1].append((home_id, text))
+            futures = [(indexes, self._shards[name].request("commands", items)) for name, (indexes, items) in batches.items()]
+        results = [None] * len(commands)
+        for indexes, future in futures:
+            for index, result in zip(indexes, future.result()):
+                results[index] = result
+        return results
+
+    def add_worker(self):
+        with self._lock:
+            name = f"shard-{self._next}"
+            self._next += 1
+            self._shards[name] = _Shard(name, self._context, self.state_dir, self.idle_timeout)
+            self._ring.add(name)
+            self._rebalance()
+            return name
+
+    def remove_worker(self, name=None):
+        with self._lock:
+            if name is None:
+                name = list(self._shards)[-1]
+            if len(self._shards) == 1:
+                raise ValueError("Cannot remove the last worker")
+            self._ring.remove(name)
+            self._rebalance()
+            self._shards.pop(name).close()
+            return name
+
+    # Move every placed home whose owner changed; called with the lock held,
+    # so no command can be routed while homes are in transit
+    def _rebalance(self):
+        moves = {}
+        for home_id, owner in self._placement.items():
+            target = self._ring.node_for(home_id)
+            if target != owner:
+                moves.setdefault(owner, {})[home_id] = target
+        exports = [(homes, self._shards[owner].request("export", list(homes))) for owner, homes in moves.items()]
+        imports = {}
+        for homes, future in exports:
+            for home_id, state in future.result().items():
+                imports.setdefault(homes[home_id], {})[home_id] = state
+        for future in [self._shards[target].request("import", states) for target, states in imports.items()]:
+            future.result()
+        for homes in moves.values():
+            self._placement.update(homes)
+            self.moved += len(homes)
+
+    def close(self):
+        with self._lock:
+            shards, self._shards = list(self._shards.values()), {}
+            for shard in shards:
+                shard.close()
+
+
+# Replay JSON lines of {"home": ..., "text": ...} from stdin and write one
+# JSON reply per line, in input order
+def main():
+    parser = argparse.ArgumentParser(description="Run home commands from stdin on a pool of worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--state-dir", help="persist every home under this directory (default: in memory)")
+    parser.add_argument("--batch", type=int, default=4096, help="commands read before they are dispatched")
+    args = parser.parse_args()
+
+    def flush(pending):
+        for (home_id, _), result in zip(pending, pool.map(pending)):
+            print(json.dumps({"home": home_id, "reply": result.text, "intent": result.intent, "changed": result.changed}))
+
+    with ShardPool(args.workers, args.state_dir) as pool:
+        pending = []
+        for line in sys.stdin:
+            if line.strip():
+                request = json.loads(line)
+                pending.append((str(request.get("home", "default")), request["text"]))
+                if len(pending) >= args.batch:
+                    flush(pending)
+                    pending = []
+        if pending:
+            flush(pending)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import atexit
+import heapq
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from devices import DEVICE_TYPES, DeviceRegistry
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".home_state")
+LOG_NAME = "devices.log"
+SNAPSHOT_NAME = "devices.snap"
+
+# Snapshot layout: header, fixed-size device records, the current device id
+# of every type, then the string table (rooms, states, music) that records
+# refer to by index. Index 0 stands for None.
+MAGIC = b"HASNAP01"
+HEADER = struct.Struct("<8sQQQQ")
+RECORD = struct.Struct("<QBIIiiI")
+LENGTH = struct.Struct("<I")
+MISSING = -2 ** 31
+TYPES = list(DEVICE_TYPES)
+TYPE_INDEX = {device_type: i for i, device_type in enumerate(TYPES)}
+CURRENT = struct.Struct(f"<{len(TYPES)}Q")
+
+
+def _fsync_dir(directory):
+    if os.name != "nt":
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def write_snapshot(registry, path, seq):
+    strings = {None: 0}
+    table = []
+
+    def intern(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+            table.append(str(value).encode("utf-8"))
+        return index
+
+    devices = registry.devices()
+    records = bytearray()
+    for d in devices:
+        records += RECORD.pack(
+            d.id, TYPE_INDEX[d.type], intern(d.room), intern(d.state),
+            MISSING if d.temperature is None else d.temperature,
+            MISSING if d.level is None else d.level,
+            intern(d.playing),
+        )
+    current = registry.current_ids()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, seq, registry.next_id, len(devices), len(table)))
+        f.write(records)
+        f.write(CURRENT.pack(*(current.get(device_type, 0) for device_type in TYPES)))
+        f.write(b"".join(LENGTH.pack(len(s)) + s for s in table))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path))
+
+
+# Load a snapshot into an empty registry and return the log sequence number
+# it covers. The file is memory-mapped and records are unpacked in place.
+def load_snapshot(path, registry):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        with memoryview(m) as view:
+            magic, seq, next_id, count, string_count = HEADER.unpack_from(view, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a device snapshot")
+            records_end = HEADER.size + count * RECORD.size
+            pos = records_end + CURRENT.size
+            strings = [None]
+            for _ in range(string_count):
+                (length,) = LENGTH.unpack_from(view, pos)
+                pos += LENGTH.size
+                strings.append(bytes(view[pos:pos + length]).decode("utf-8"))
+                pos += length
+            with view[HEADER.size:records_end] as records:
+                for device_id, type_index, room, state, temperature, level, playing in RECORD.iter_unpack(records):
+                    registry.add(
+                        TYPES[type_index], strings[room], device_id=device_id, state=strings[state],
+                        temperature=None if temperature == MISSING else temperature,
+                        level=None if level == MISSING else level,
+                        playing=strings[playing],
+                    )
+            current = CURRENT.unpack_from(view, records_end)
+    for device_type, device_id in zip(TYPES, current):
+        if device_id:
+            registry.apply(("current", device_type, device_id))
+    registry.next_id = next_id
+    return seq
+
+
+# The one thread that commits every open StateLog in the process. A log
+# schedules a deadline when a batch starts and asks for an immediate commit
+# when the batch fills; the thread sleeps until the earliest deadline, so a
+# process with thousands of homes still has a single, mostly idle, flusher.
+# Logs still open at exit are closed (and so flushed) by one atexit hook.
+class _Flusher:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._deadlines = []
+        self._urgent = []
+        self._open = set()
+        self._order = itertools.count()
+        self._thread = None
+
+    def add(self, log):
+        with self._cond:
+            self._open.add(log)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="state-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.close_all)
+
+    def discard(self, log):
+        with self._cond:
+            self._open.discard(log)
+
+    def schedule(self, log, deadline):
+        with self._cond:
+            heapq.heappush(self._deadlines, (deadline, next(self._order), log))
+            if self._deadlines[0][2] is log:
+                self._cond.notify()
+
+    def urgent(self, log):
+        with self._cond:
+            self._urgent.append(log)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            logs = list(self._open)
+        for log in logs:
+            log.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    if self._urgent or (self._deadlines and self._deadlines[0][0] <= now):
+                        break
+                    self._cond.wait(self._deadlines[0][0] - now if self._deadlines else None)
+                due, self._urgent = self._urgent, []
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    due.append(heapq.heappop(self._deadlines)[2])
+            for log in dict.fromkeys(due):
+                try:
+                    log.commit()
+                except Exception:
+                    pass
+
+
+_flusher = _Flusher()
+
+
+# Append-only write-ahead log of device changes with group commit.
+#
+# The registry hands every change to record(), which only appends a line to
+# an in-memory batch; the shared flusher thread writes and fsyncs the batch
+# sync_interval seconds after it started (or sooner once batch_size records
+# are waiting; with sync_interval None, only then).
+# Each line is "<crc32 hex><json>" so a torn tail after a crash is detected
+# and cut off on the next start. Once the log passes compact_bytes it is
+# folded into a binary snapshot and truncated, so a restart maps the
+# snapshot and replays only the short tail written since.
+class StateLog:
+    def __init__(self, directory=DEFAULT_DIR, sync_interval=0.05, batch_size=512, compact_bytes=4 * 1024 * 1024):
+        self.directory = directory
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.compact_bytes = compact_bytes
+        self.registry = None
+        self.seq = 0
+        self._buffer = []
+        self._size = 0
+        self._file = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._counters = {"records": 0, "batches": 0, "bytes": 0, "compactions": 0, "replayed": 0, "load_seconds": 0.0}
+
+    # Load the snapshot and log tail into a registry, attach the log to it
+    # and return it. A brand new directory starts from seed().
+    def open(self, seed=DeviceRegistry.with_defaults):
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        has_snapshot = os.path.exists(self.snapshot_path)
+        if has_snapshot or os.path.exists(self.log_path):
+            registry = DeviceRegistry()
+            self.seq = load_snapshot(self.snapshot_path, registry) if has_snapshot else 0
+            self._replay(registry)
+        else:
+            registry = seed()
+            write_snapshot(registry, self.snapshot_path, 0)
+        self._file = open(self.log_path, "ab")
+        self._size = self._file.tell()
+        self.registry = registry
+        registry.journal = self
+        self._counters["load_seconds"] = time.perf_counter() - start
+        _flusher.add(self)
+        return registry
+
+    def _replay(self, registry):
+        if not os.path.exists(self.log_path):
+            return
+        good = 0
+        with open(self.log_path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                data = line[8:-1]
+                try:
+                    if int(line[:8], 16) != zlib.crc32(data):
+                        break
+                    record = json.loads(data)
+                except ValueError:
+                    break
+                good += len(line)
+                if record[0] <= self.seq:
+                    continue
+                registry.apply(record[1:])
+                self.seq = record[0]
+                self._counters["replayed"] += 1
+        if good != os.path.getsize(self.log_path):
+            with open(self.log_path, "r+b") as f:
+                f.truncate(good)
+
+    def record(self, event):
+        with self._cond:
+            self.seq += 1
+            data = json.dumps([self.seq, *event], separators=(",", ":")).encode("utf-8")
+            self._buffer.append(b"%08x%s\n" % (zlib.crc32(data), data))
+            self._counters["records"] += 1
+            pending = len(self._buffer)
+        if pending == 1 and self.sync_interval is not None:
+            _flusher.schedule(self, time.monotonic() + self.sync_interval)
+        if pending == self.batch_size:
+            _flusher.urgent(self)
+
+    # Write and fsync everything recorded so far
+    def flush(self):
+        with self._io_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            if not batch or self._file is None:
+                return
+            data = b"".join(batch)
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size += len(data)
+            self._counters["batches"] += 1
+            self._counters["bytes"] += len(data)
+
+    # Fold the log into a fresh snapshot and truncate it
+    def compact(self):
+        with self.registry.frozen(), self._io_lock:
+            if self._file is None:
+                return
+            with self._cond:
+                self._buffer = []
+                seq = self.seq
+            write_snapshot(self.registry, self.snapshot_path, seq)
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size = 0
+            self._counters["compactions"] += 1
+
+    # Called by the flusher: write the batch, then compact if the log is big
+    def commit(self):
+        self.flush()
+        if self._size >= self.compact_bytes:
+            self.compact()
+
+    def close(self):
+        with self._cond:
+            if self._closed or self._file is None:
+                return
+            self._closed = True
+        _flusher.discard(self)
+        self.flush()
+        with self._io_lock:
+            self.registry.journal = None
+            self._file.close()
+            self._file = None
+
+    def stats(self):
+        with self._cond:
+            return dict(self._counters, seq=self.seq, log_bytes=self._size, pending=len(self._buffer))
+
+
+_homes = {}
+_homes_lock = threading.Lock()
+
+
+# Process-wide persistent home for a state directory, shared by every
+# Streamlit rerun and session
+def get_home(directory=DEFAULT_DIR):
+    with _homes_lock:
+        if directory not in _homes:
+            _homes[directory] = StateLog(directory).open()
+        return _homes[directory]
+
+
+# Flush and close a home opened by get_home and forget it, so another
+# process can open the same directory
+def release_home(directory=DEFAULT_DIR):
+    with _homes_lock:
+        registry = _homes.pop(directory, None)
+    if registry is not None and registry.journal is not None:
+        registry.journal.close()
+    return registry
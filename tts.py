@@ -0,0 +1,303 @@
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+RATE = 150
+VOLUME = 1
+
+
+# Raised by a render that was stopped part-way, so the cache keeps nothing
+class SpeechInterrupted(Exception):
+    pass
+
+
+def _pyttsx3_engine():
+    import pyttsx3
+    return pyttsx3.init()
+
+
+def _default_play_command():
+    for command in (["afplay"], ["aplay", "-q"], ["paplay"], ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"]):
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+# Plays rendered audio files through the platform's command-line player
+# (winsound on Windows). play() blocks until the file ends or stop() is
+# called from another thread. play() checks cancelled() under the same
+# lock stop() takes, so a stop that lands just before playback starts
+# still takes effect.
+class SystemPlayer:
+    def __init__(self, command=None):
+        self.command = command or _default_play_command()
+        self._process = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return sys.platform == "win32" or self.command is not None
+
+    def play(self, path, cancelled=None):
+        if sys.platform == "win32":
+            import winsound
+            if cancelled is None or not cancelled():
+                winsound.PlaySound(path, winsound.SND_FILENAME)
+            return
+        with self._lock:
+            if cancelled is not None and cancelled():
+                return
+            self._process = subprocess.Popen(self.command + [path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            process = self._process
+        process.wait()
+
+    def stop(self):
+        if sys.platform == "win32":
+            import winsound
+            winsound.PlaySound(None, winsound.SND_PURGE)
+            return
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+
+
+# Long-lived text-to-speech worker.
+#
+# One daemon thread owns a single engine (pyttsx3 engines are not safe to
+# share between threads) and speaks utterances taken from a queue, so say()
+# returns to the UI immediately. A newer reply interrupts whatever is still
+# playing or waiting: say() only moves a cutoff, and the worker thread stops
+# its own engine from the engine's word callback once the utterance it is
+# on falls behind it. Pass engine_factory to use something other than
+# pyttsx3, e.g. a fake engine that records calls instead of producing audio.
+#
+# With a SpeechCache and a player, replies are rendered to audio files once
+# and repeats are played straight from the cache instead of synthesized.
+class SpeechWorker:
+    def __init__(self, engine_factory=_pyttsx3_engine, rate=RATE, volume=VOLUME, cache=None, player=None):
+        self.engine_factory = engine_factory
+        self.cache = cache
+        self.player = player
+        self.rate = rate
+        self.volume = volume
+        self.error = None
+        self._engine = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._seq = 0
+        self._cutoff = 0
+        self._speaking = False
+        self._current = None
+        self._aborted = False
+        self._warming = False
+        self._pending = 0
+        self._ready = threading.Event()
+        self._counters = {"queued": 0, "spoken": 0, "interrupted": 0, "dropped": 0, "failed": 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._wait_total = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="speech-worker", daemon=True)
+                self._thread.start()
+        return self
+
+    # Queue text to be spoken and return at once. With interrupt=True any
+    # queued utterances are discarded and the one playing is stopped.
+    def say(self, text, interrupt=True):
+        self.start()
+        with self._lock:
+            self._seq += 1
+            if interrupt:
+                self._move_cutoff(self._seq)
+            self._counters["queued"] += 1
+            self._pending += 1
+            self._queue.put((self._seq, text, time.perf_counter()))
+        if interrupt and self.player is not None:
+            self.player.stop()
+
+    # Pre-render texts into the cache on the worker thread. Warming yields to
+    # replies: it pauses whenever one is queued, abandoning the text it is
+    # on, and picks up again once the queue is empty.
+    def warm(self, texts):
+        if self.cache is None or self.player is None:
+            return
+        self.start()
+        with self._lock:
+            self._pending += 1
+            self._queue.put((None, list(texts), time.perf_counter()))
+
+    # Stop any speech in progress and drop everything still queued
+    def interrupt(self):
+        with self._lock:
+            self._move_cutoff(self._seq + 1)
+        if self.player is not None:
+            self.player.stop()
+
+    # Everything queued before cutoff is dropped. An utterance cut off while
+    # it is playing counts once, as interrupted, and never as spoken.
+    def _move_cutoff(self, cutoff):
+        if self._speaking and not self._cancelled(self._current):
+            self._counters["interrupted"] += 1
+        self._cutoff = cutoff
+
+    def _cancelled(self, seq):
+        return seq < self._cutoff
+
+    # Engine callback, on the worker thread inside runAndWait()
+    def _on_word(self, name, location, length):
+        if (self._warming and not self._queue.empty()) or (self._current is not None and self._cancelled(self._current)):
+            self._aborted = True
+            self._engine.stop()
+
+    # Block until the queue is empty and nothing is playing; for tests and
+    # benchmarks, the UI never waits.
+    def wait_idle(self, timeout=None):
+        self._ready.wait(timeout)
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(0.001)
+
+    def close(self, timeout=None):
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            spoken = self._counters["spoken"]
+            return dict(
+                self._counters,
+                cache=self.cache.stats() if self.cache is not None else None,
+                queue_depth=self._queue.qsize(),
+                speaking=self._speaking,
+                avg_latency=self._latency_total / spoken if spoken else 0.0,
+                max_latency=self._latency_max,
+                avg_queue_wait=self._wait_total / spoken if spoken else 0.0,
+            )
+
+    def _run(self):
+        try:
+            engine = self.engine_factory()
+            engine.setProperty("rate", self.rate)
+            engine.setProperty("volume", self.volume)
+            if self.cache is not None:
+                self.cache.voice = engine.getProperty("voice")
+                self.cache.rate = self.rate
+                self.cache.volume = self.volume
+            if hasattr(engine, "connect"):
+                engine.connect("started-word", self._on_word)
+            self._engine = engine
+        except Exception as e:
+            self.error = e
+        self._ready.set()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            seq, text, queued_at = item
+            if seq is None:
+                self._warm(text)
+                continue
+            with self._lock:
+                if seq < self._cutoff or self._engine is None:
+                    self._counters["dropped"] += 1
+                    self._pending -= 1
+                    continue
+                self._speaking = True
+                self._current = seq
+            started = time.perf_counter()
+            try:
+                self._speak(seq, text)
+            except SpeechInterrupted:
+                with self._lock:
+                    self._speaking = False
+                    self._current = None
+                    self._pending -= 1
+                continue
+            except Exception as e:
+                self.error = e
+                with self._lock:
+                    self._counters["failed"] += 1
+                    self._speaking = False
+                    self._current = None
+                    self._pending -= 1
+                continue
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._speaking = False
+                self._current = None
+                self._pending -= 1
+                if self._cancelled(seq):
+                    continue
+                self._counters["spoken"] += 1
+                self._latency_total += elapsed
+                self._latency_max = max(self._latency_max, elapsed)
+                self._wait_total += started - queued_at
+
+    def _speak(self, seq, text):
+        if self.cache is not None and self.player is not None:
+            self.player.play(self.cache.fetch(text, self._render), cancelled=lambda: self._cancelled(seq))
+        elif not self._cancelled(seq):
+            self._engine.say(text)
+            self._engine.runAndWait()
+
+    def _render(self, text, path):
+        self._aborted = False
+        self._engine.save_to_file(text, path)
+        self._engine.runAndWait()
+        if self._aborted:
+            raise SpeechInterrupted(text)
+
+    def _warm(self, texts):
+        if self._engine is not None:
+            for i, text in enumerate(texts):
+                if not self._queue.empty():
+                    self._queue.put((None, texts[i:], time.perf_counter()))
+                    return
+                self._warming = True
+                try:
+                    self.cache.warm([text], self._render)
+                except SpeechInterrupted:
+                    self._queue.put((None, texts[i:], time.perf_counter()))
+                    return
+                except Exception as e:
+                    self.error = e
+                    break
+                finally:
+                    self._warming = False
+        with self._lock:
+            self._pending -= 1
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# Process-wide worker shared by every Streamlit rerun and session. When a
+# system audio player is available, replies go through the speech cache and
+# warm_texts are rendered ahead of time in the background, behind any reply.
+def get_worker(warm_texts=()):
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            player = SystemPlayer()
+            if player.available():
+                from tts_cache import SpeechCache
+                _worker = SpeechWorker(cache=SpeechCache(), player=player).start()
+                _worker.warm(warm_texts)
+            else:
+                _worker = SpeechWorker().start()
+        return _worker
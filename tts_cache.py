@@ -0,0 +1,150 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+SUFFIX = ".wav"
+# Renders in progress; never indexed, and removed on load if a crash left one
+TEMP_SUFFIX = ".tmp"
+
+
+# Content-addressed cache of rendered speech.
+#
+# Files are named by a hash of the text plus the voice settings, so changing
+# voice, rate or volume never serves stale audio. The in-memory index keeps
+# files in least-recently-used order and evicts from the cold end once the
+# total size goes over max_bytes. Recency survives restarts through file
+# modification times, which are bumped on every hit.
+class SpeechCache:
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=DEFAULT_MAX_BYTES, voice=None, rate=None, volume=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.total_bytes = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "renders": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # Keys are hex digests, so a "tmp" name is always an unfinished
+            # render (older versions named them tmp*.wav)
+            if name.endswith(TEMP_SUFFIX) or name.startswith(tempfile.gettempprefix()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(SUFFIX):
+                continue
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, name[:-len(SUFFIX)], info.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def key(self, text):
+        raw = "\0".join(str(part) for part in (text, self.voice, self.rate, self.volume))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    # Path of the cached audio for text, or None on a miss
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            if key not in self._index:
+                self._stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+            self._stats["hits"] += 1
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._index.pop(key, 0)
+            return None
+        return path
+
+    # Cached audio for text, rendering it with render(text, path) on a miss
+    def fetch(self, text, render):
+        path = self.get(text)
+        if path is None:
+            path = self.put(text, render)
+        return path
+
+    # Render text into the cache. The audio is written to a temporary file and
+    # only moved into place if render() returns; if it raises (e.g. the
+    # render was interrupted) the partial file is removed and nothing is
+    # stored under the key.
+    def put(self, text, render):
+        key = self.key(text)
+        path = self.path(key)
+        fd, tmp = tempfile.mkstemp(suffix=TEMP_SUFFIX, dir=self.directory)
+        os.close(fd)
+        try:
+            render(text, tmp)
+            size = os.path.getsize(tmp)
+            if not size:
+                raise RuntimeError("speech engine produced no audio")
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self.total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._stats["renders"] += 1
+            self._evict()
+        return path
+
+    def read(self, text, render):
+        with open(self.fetch(text, render), "rb") as f:
+            return f.read()
+
+    # Pre-render replies that are not cached yet
+    def warm(self, texts, render):
+        rendered = 0
+        for text in texts:
+            with self._lock:
+                cached = self.key(text) in self._index
+            if not cached:
+                self.put(text, render)
+                rendered += 1
+        return rendered
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                entries=len(self._index),
+                bytes=self.total_bytes,
+                hit_rate=self._stats["hits"] / lookups if lookups else 0.0,
+            )
@@ -0,0 +1,273 @@
+import argparse
+import array
+import math
+import queue
+import sys
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+FRAME_MS = 30
+SAMPLE_WIDTH = 2
+
+VoiceResult = namedtuple("VoiceResult", "text reply timings error")
+
+
+# Mono 16-bit WAV file. With realtime=True frames are paced at their
+# playback duration, so latency figures match a live microphone.
+class WavSource:
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.realtime = realtime
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != SAMPLE_WIDTH or wav.getnchannels() != 1:
+                raise ValueError(f"{path}: expected mono 16-bit PCM")
+            self.sample_rate = wav.getframerate()
+
+    def frames(self, frame_ms=FRAME_MS):
+        with wave.open(self.path, "rb") as wav:
+            yield from _paced(lambda n: wav.readframes(n), self.sample_rate, frame_ms, self.realtime)
+
+
+# Raw little-endian mono 16-bit PCM from any binary file-like object
+class PCMSource:
+    def __init__(self, stream, sample_rate=16000, realtime=False):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+
+    def frames(self, frame_ms=FRAME_MS):
+        yield from _paced(lambda n: self.stream.read(n * SAMPLE_WIDTH), self.sample_rate, frame_ms, self.realtime)
+
+
+# Live microphone through speech_recognition/PyAudio
+class MicrophoneSource:
+    def __init__(self, sample_rate=16000, device_index=None, seconds=None):
+        self.sample_rate = sample_rate
+        self.device_index = device_index
+        self.seconds = seconds
+
+    def frames(self, frame_ms=FRAME_MS):
+        import speech_recognition as sr
+        size = self.sample_rate * frame_ms // 1000
+        deadline = None if self.seconds is None else time.perf_counter() + self.seconds
+        with sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate) as mic:
+            while deadline is None or time.perf_counter() < deadline:
+                yield mic.stream.read(size)
+
+
+def _paced(read, sample_rate, frame_ms, realtime):
+    size = sample_rate * frame_ms // 1000
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        data = read(size)
+        if not data:
+            return
+        if realtime:
+            delay = start + sent * frame_ms / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent += 1
+        yield data
+
+
+def rms(frame):
+    samples = array.array("h", frame[:len(frame) - len(frame) % SAMPLE_WIDTH])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+# Energy-based voice activity detector that splits a frame stream into
+# utterances. Speech starts after start_ms of loud frames and ends after
+# hangover_ms of quiet ones; the threshold follows the background noise
+# floor so a noisy room does not read as one endless utterance.
+class EnergyVAD:
+    def __init__(self, frame_ms=FRAME_MS, threshold=300.0, ratio=3.0, start_ms=90, hangover_ms=300, preroll_ms=150, max_ms=15000):
+        self.threshold = threshold
+        self.ratio = ratio
+        self.start_frames = max(1, start_ms // frame_ms)
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.max_frames = max_ms // frame_ms
+        self.noise_floor = threshold / ratio
+        self._preroll = deque(maxlen=max(self.start_frames, preroll_ms // frame_ms))
+        self._voiced = 0
+        self._silent = 0
+        self._speech = None
+
+    def feed(self, frame):
+        energy = rms(frame)
+        voiced = energy > max(self.threshold, self.noise_floor * self.ratio)
+        if self._speech is None:
+            self._preroll.append(frame)
+            if not voiced:
+                self._voiced = 0
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * energy
+                return None
+            self._voiced += 1
+            if self._voiced >= self.start_frames:
+                self._speech = list(self._preroll)
+                self._preroll.clear()
+                self._silent = 0
+            return None
+        self._speech.append(frame)
+        self._silent = 0 if voiced else self._silent + 1
+        if self._silent >= self.hangover_frames or len(self._speech) >= self.max_frames:
+            return self.flush()
+        return None
+
+    def flush(self):
+        speech, self._speech = self._speech, None
+        self._voiced = 0
+        if not speech:
+            return None
+        return b"".join(speech)
+
+
+# Offline recognition with CMU Sphinx through speech_recognition
+def recognize_sphinx(audio, sample_rate, sample_width=SAMPLE_WIDTH):
+    import speech_recognition as sr
+    try:
+        return sr.Recognizer().recognize_sphinx(sr.AudioData(audio, sample_rate, sample_width))
+    except sr.UnknownValueError:
+        return None
+
+
+def _timed_recognize(recognizer, audio, sample_rate):
+    start = time.perf_counter()
+    try:
+        text, error = recognizer(audio, sample_rate, SAMPLE_WIDTH), None
+    except Exception as e:
+        text, error = None, str(e)
+    return text, time.perf_counter() - start, error
+
+
+# Streaming voice pipeline: capture -> VAD -> recognition -> reply.
+#
+# The caller's thread captures audio and cuts utterances. Each utterance
+# goes to a thread or process pool for recognition while capture carries
+# on, and a single responder thread turns transcripts into replies in the
+# order they were spoken. Every result carries per-stage latencies measured
+# from the moment the VAD detected the end of speech.
+class VoicePipeline:
+    def __init__(self, recognizer=recognize_sphinx, responder=None, workers=2, use_processes=False, vad_options=None):
+        if responder is None:
+            from commands import get_assistant_response
+            responder = get_assistant_response
+        self.recognizer = recognizer
+        self.responder = responder
+        self.workers = workers
+        self.use_processes = use_processes
+        self.vad_options = vad_options or {}
+
+    def run(self, source, on_result=None, max_utterances=None, frame_ms=FRAME_MS):
+        results = []
+        pending = queue.Queue()
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        responder = threading.Thread(target=self._respond, args=(pending, results, on_result), daemon=True)
+        responder.start()
+        vad = EnergyVAD(frame_ms=frame_ms, **self.vad_options)
+        submitted = 0
+        with executor_class(max_workers=self.workers) as executor:
+            frames = source.frames(frame_ms)
+            try:
+                for frame in frames:
+                    audio = vad.feed(frame)
+                    if audio is not None:
+                        self._submit(executor, pending, audio, source.sample_rate)
+                        submitted += 1
+                        if max_utterances is not None and submitted >= max_utterances:
+                            break
+                else:
+                    audio = vad.flush()
+                    if audio is not None:
+                        self._submit(executor, pending, audio, source.sample_rate)
+            finally:
+                frames.close()
+                pending.put(None)
+                responder.join()
+        return results
+
+    def _submit(self, executor, pending, audio, sample_rate):
+        end_of_speech = time.perf_counter()
+        future = executor.submit(_timed_recognize, self.recognizer, audio, sample_rate)
+        stamp = {}
+        future.add_done_callback(lambda f: stamp.setdefault("done", time.perf_counter()))
+        pending.put((end_of_speech, len(audio) / (sample_rate * SAMPLE_WIDTH), future, stamp))
+
+    def _respond(self, pending, results, on_result):
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            end_of_speech, duration, future, stamp = item
+            text, recognize, error = future.result()
+            done = stamp.get("done", time.perf_counter())
+            reply = None
+            start = time.perf_counter()
+            if text:
+                reply = self.responder(text)
+            finished = time.perf_counter()
+            timings = {
+                "audio": duration,
+                "queue": max(0.0, done - end_of_speech - recognize),
+                "recognize": recognize,
+                "respond": finished - start,
+                "total": finished - end_of_speech,
+            }
+            result = VoiceResult(text, reply, timings, error)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Mean/p50/p95 of each timing stage across results
+def summarize(results):
+    summary = {}
+    for stage in ("queue", "recognize", "respond", "total"):
+        values = [r.timings[stage] for r in results]
+        if values:
+            summary[stage] = {"mean": sum(values) / len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run voice commands from a WAV/PCM file or the microphone")
+    parser.add_argument("path", nargs="?", help="mono 16-bit WAV file, raw PCM with --raw, or omit for the microphone")
+    parser.add_argument("--raw", action="store_true", help="treat path as raw PCM")
+    parser.add_argument("--rate", type=int, default=16000, help="sample rate for raw PCM and the microphone")
+    parser.add_argument("--realtime", action="store_true", help="pace file input at playback speed")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--processes", action="store_true", help="recognize in a process pool")
+    args = parser.parse_args()
+
+    if args.path is None:
+        source = MicrophoneSource(args.rate)
+    elif args.raw:
+        source = PCMSource(open(args.path, "rb"), args.rate, args.realtime)
+    else:
+        source = WavSource(args.path, args.realtime)
+
+    def show(result):
+        print(f"> {result.text or '(not recognized)'}")
+        if result.reply:
+            print(result.reply)
+        print("  " + "  ".join(f"{stage}={value * 1000:.1f}ms" for stage, value in result.timings.items()))
+
+    results = VoicePipeline(workers=args.workers, use_processes=args.processes).run(source, on_result=show)
+    for stage, values in summarize(results).items():
+        print(f"{stage:>10}: mean {values['mean'] * 1000:.1f}ms  p50 {values['p50'] * 1000:.1f}ms  p95 {values['p95'] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()